@@ -0,0 +1,114 @@
+"""
+Cold-storage archiving of old activity and execution logs.
+
+Records older than the retention threshold are appended to day-partitioned
+gzip NDJSON files (ARCHIVE_DIR/<log type>/<YYYY-MM-DD>.ndjson.gz) and then
+deleted from MongoDB in batches, keeping the hot collections small while the
+history stays queryable through the archive endpoints.
+"""
+
+import asyncio
+import gzip
+import logging
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+import orjson
+
+from compact_storage import restore_id
+
+logger = logging.getLogger(__name__)
+
+# log type -> (collection, timestamp field)
+ARCHIVE_SOURCES = {
+    "activities": ("bot_activities", "timestamp"),
+    "executions": ("script_executions", "execution_time"),
+}
+
+
+def _write_partitions(directory: Path, partitions: Dict[str, List[bytes]]):
+    directory.mkdir(parents=True, exist_ok=True)
+    for day, lines in partitions.items():
+        # Appending creates another gzip member; readers handle multi-member files
+        with gzip.open(directory / f"{day}.ndjson.gz", "ab") as archive_file:
+            archive_file.write(b"".join(lines))
+
+
+class LogArchiver:
+    def __init__(self, db, root: Path, retention_days: float = 90.0, batch_size: int = 1000):
+        self.db = db
+        self.root = Path(root)
+        self.retention_days = retention_days
+        self.batch_size = batch_size
+
+    def _source(self, log_type: str):
+        if log_type not in ARCHIVE_SOURCES:
+            raise ValueError(f"Unknown log type '{log_type}'")
+        return ARCHIVE_SOURCES[log_type]
+
+    async def archive(self, log_type: str, context=None) -> int:
+        """Move records older than the retention threshold into the archive"""
+        collection_name, time_field = self._source(log_type)
+        collection = self.db[collection_name]
+        cutoff = datetime.utcnow() - timedelta(days=self.retention_days)
+        directory = self.root / log_type
+        archived = context.checkpoint.get(log_type, 0) if context else 0
+
+        while True:
+            batch = await collection.find({time_field: {"$lt": cutoff}}).sort(time_field, 1).limit(self.batch_size).to_list(self.batch_size)
+            if not batch:
+                return archived
+
+            partitions: Dict[str, List[bytes]] = {}
+            for record in batch:
+                day = record[time_field].strftime("%Y-%m-%d")
+                line = orjson.dumps(restore_id(dict(record)))
+                partitions.setdefault(day, []).append(line + b"\n")
+            await asyncio.to_thread(_write_partitions, directory, partitions)
+
+            # Only delete once the batch is safely on disk
+            await collection.delete_many({"_id": {"$in": [record["_id"] for record in batch]}})
+            archived += len(batch)
+            if context:
+                await context.report(archived, None, {**context.checkpoint, log_type: archived})
+
+    async def archive_all(self, context=None) -> Dict[str, int]:
+        results = {}
+        for log_type in ARCHIVE_SOURCES:
+            results[log_type] = await self.archive(log_type, context)
+            if results[log_type]:
+                logger.info(f"Archived {results[log_type]} {log_type} records")
+        return results
+
+    def partitions(self, log_type: str) -> List[dict]:
+        self._source(log_type)
+        directory = self.root / log_type
+        if not directory.exists():
+            return []
+        return [
+            {"date": path.name[:10], "size_bytes": path.stat().st_size}
+            for path in sorted(directory.glob("*.ndjson.gz"))
+        ]
+
+    def iter_records(self, log_type: str, start: date, end: Optional[date] = None) -> Iterator[bytes]:
+        """Archived NDJSON lines for the inclusive date range, oldest first"""
+        self._source(log_type)
+        return self._iter_partitions(self.root / log_type, start, end or start)
+
+    def _iter_partitions(self, directory: Path, start: date, end: date) -> Iterator[bytes]:
+        day = start
+        while day <= end:
+            path = directory / f"{day.isoformat()}.ndjson.gz"
+            if path.exists():
+                # A crash between writing and deleting can archive a record twice
+                seen = set()
+                with gzip.open(path, "rb") as archive_file:
+                    for line in archive_file:
+                        record_id = orjson.loads(line).get("id")
+                        if record_id is not None:
+                            if record_id in seen:
+                                continue
+                            seen.add(record_id)
+                        yield line
+            day += timedelta(days=1)
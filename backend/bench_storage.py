@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Per-operation latency of the storage backends on the bot's hot path.
+
+Runs the same operation mix against embedded SQLite and, when a MongoDB URL
+is available (--mongo-url or MONGO_URL), against MongoDB, using scratch
+databases that are removed afterwards.
+
+    python bench_storage.py [--users 500] [--mongo-url mongodb://localhost:27017]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from storage import MongoStorage
+from sqlite_storage import SQLiteStorage
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def run_operations(storage, users: int):
+    timings = defaultdict(list)
+
+    async def timed(name, coroutine):
+        started = time.perf_counter()
+        result = await coroutine
+        timings[name].append((time.perf_counter() - started) * 1000)
+        return result
+
+    await storage.ensure_indexes()
+    now = datetime.utcnow()
+    license_keys = []
+    for telegram_id in range(1, users + 1):
+        user_id = str(uuid.uuid4())
+        await timed("insert_user", storage.insert_user({
+            "id": user_id, "telegram_id": telegram_id, "username": f"user{telegram_id}",
+            "script_executions": 0, "created_at": now, "last_activity": now,
+        }))
+        license_key = f"BENCH{telegram_id:011d}"
+        license_keys.append(license_key)
+        await timed("insert_licenses", storage.insert_licenses([{
+            "id": str(uuid.uuid4()), "license_key": license_key, "is_used": False,
+            "duration_days": 30.0, "max_executions": 10, "executions_used": 0, "created_at": now,
+        }]))
+
+    # What one /start or button press costs
+    for telegram_id, license_key in enumerate(license_keys, start=1):
+        await timed("get_user", storage.get_user(telegram_id))
+        await timed("get_license", storage.get_license(license_key))
+        await timed("consume_license_execution", storage.consume_license_execution(license_key))
+        await timed("increment_user", storage.increment_user(telegram_id, "script_executions"))
+        await timed("insert_activity", storage.insert_activity({
+            "id": str(uuid.uuid4()), "telegram_id": telegram_id, "action": "callback",
+            "message": "start_program", "timestamp": datetime.utcnow(),
+        }))
+        await timed("open_ticket", storage.open_ticket({
+            "id": str(uuid.uuid4()), "user_id": str(telegram_id), "telegram_id": telegram_id,
+            "type": "purchase", "status": "open", "message": "License purchase requested",
+            "request_count": 1, "created_at": now, "updated_at": datetime.utcnow(),
+        }))
+
+    await timed("update_users (write-behind batch)", storage.update_users(
+        {telegram_id: {"last_activity": datetime.utcnow()} for telegram_id in range(1, users + 1)}
+    ))
+    for _ in range(20):
+        await timed("list_documents (200 activities)", storage.list_documents(
+            "bot_activities", ["id", "telegram_id", "action", "timestamp"], limit=200
+        ))
+    return timings
+
+
+def report(name: str, timings):
+    print(f"\n{name}")
+    print(f"  {'operation':36} {'n':>6} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9}")
+    for operation, values in timings.items():
+        print(
+            f"  {operation:36} {len(values):6d} {statistics.mean(values):9.3f} "
+            f"{percentile(values, 0.5):9.3f} {percentile(values, 0.95):9.3f}"
+        )
+
+
+async def main(args):
+    with tempfile.TemporaryDirectory() as directory:
+        storage = SQLiteStorage(Path(directory) / "bench.sqlite3")
+        try:
+            report("sqlite (WAL)", await run_operations(storage, args.users))
+        finally:
+            await storage.close()
+
+    if not args.mongo_url:
+        print("\nmongo: skipped (no --mongo-url or MONGO_URL)")
+        return
+
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(args.mongo_url)
+    db_name = f"license_system_bench_{uuid.uuid4().hex[:8]}"
+    try:
+        storage = MongoStorage(client[db_name], client[db_name])
+        report("mongo", await run_operations(storage, args.users))
+    finally:
+        await client.drop_database(db_name)
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--mongo-url", default=os.environ.get("MONGO_URL"))
+    asyncio.run(main(parser.parse_args()))
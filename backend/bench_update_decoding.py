@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark: fast-path update decoding vs. Update.de_json.
+
+    python bench_update_decoding.py [--iterations 20000]
+"""
+
+import argparse
+import sys
+import timeit
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from telegram import Bot, Update
+
+from fast_updates import decode_update
+
+USER = {"id": 123456789, "is_bot": False, "first_name": "Max", "last_name": "Muster", "username": "maxmuster", "language_code": "de"}
+CHAT = {"id": 123456789, "first_name": "Max", "last_name": "Muster", "username": "maxmuster", "type": "private"}
+
+SAMPLES = {
+    "message": {
+        "update_id": 1,
+        "message": {
+            "message_id": 10,
+            "from": USER,
+            "chat": CHAT,
+            "date": 1700000000,
+            "text": "/start",
+            "entities": [{"offset": 0, "length": 6, "type": "bot_command"}],
+        },
+    },
+    "callback_query": {
+        "update_id": 2,
+        "callback_query": {
+            "id": "4382bfdwdsb323b2d9",
+            "from": USER,
+            "chat_instance": "-1234567890",
+            "data": "my_status",
+            "message": {
+                "message_id": 11,
+                "from": {"id": 42, "is_bot": True, "first_name": "LicenseBot", "username": "license_bot"},
+                "chat": CHAT,
+                "date": 1700000000,
+                "text": "DEIN PROGRAMM HIER",
+                "reply_markup": {"inline_keyboard": [[{"text": "Status", "callback_data": "my_status"}]]},
+            },
+        },
+    },
+}
+
+
+def allocated_bytes(func) -> int:
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    bot = Bot(token="0:benchmark")
+    for name, payload in SAMPLES.items():
+        full = lambda: Update.de_json(payload, bot)
+        fast = lambda: decode_update(payload, bot)
+        full_us = timeit.timeit(full, number=args.iterations) / args.iterations * 1e6
+        fast_us = timeit.timeit(fast, number=args.iterations) / args.iterations * 1e6
+        print(
+            f"{name:15} de_json {full_us:8.2f} us {allocated_bytes(full):7d} B   "
+            f"fast {fast_us:7.2f} us {allocated_bytes(fast):6d} B   speedup {full_us / fast_us:5.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Opt-in compact document representation.
+
+With COMPACT_IDS=true, new User, License, Ticket, BotActivity and
+ScriptExecution documents store their uuid as a 16 byte binary `_id` instead
+of a 36 character `id` string next to an ObjectId `_id`, so each document
+carries one id and one id index instead of two. With COMPACT_ACTIVITIES=true,
+activity documents also stop repeating the username.
+
+API responses are unchanged: `restore_id` maps the binary `_id` back to the
+`id` string. Existing documents are converted by the `compact_ids` job;
+until it has finished, id lookups match both representations.
+"""
+
+import logging
+import os
+import uuid
+from typing import Iterable, List
+
+from bson.binary import Binary, UUID_SUBTYPE
+from pymongo import DeleteOne, ReplaceOne
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+COMPACT_IDS = os.environ.get("COMPACT_IDS", "false").lower() in ("1", "true", "yes")
+COMPACT_ACTIVITIES = os.environ.get("COMPACT_ACTIVITIES", "false").lower() in ("1", "true", "yes")
+
+# Collections whose documents carry a model `id`
+COMPACT_COLLECTIONS = ("users", "licenses", "tickets", "bot_activities", "script_executions")
+
+
+def _binary_id(value: str):
+    try:
+        return Binary.from_uuid(uuid.UUID(value))
+    except (ValueError, AttributeError, TypeError):
+        return None
+
+
+def id_query(value: str) -> dict:
+    """Filter for a document by its model id"""
+    if not COMPACT_IDS:
+        return {"id": value}
+    binary_id = _binary_id(value)
+    if binary_id is None:
+        return {"id": value}
+    return {"$or": [{"_id": binary_id}, {"id": value}]}
+
+
+def id_in_query(values: Iterable[str]) -> dict:
+    """Filter for documents whose model id is one of values"""
+    values = list(values)
+    if not COMPACT_IDS:
+        return {"id": {"$in": values}}
+    binary_ids = [binary_id for binary_id in map(_binary_id, values) if binary_id is not None]
+    return {"$or": [{"_id": {"$in": binary_ids}}, {"id": {"$in": values}}]}
+
+
+def to_storage(doc: dict) -> dict:
+    """Convert a model dict into the stored representation"""
+    if COMPACT_IDS and "id" in doc:
+        binary_id = _binary_id(doc["id"])
+        if binary_id is not None:
+            doc = {key: value for key, value in doc.items() if key != "id"}
+            doc["_id"] = binary_id
+    return doc
+
+
+def activity_to_storage(doc: dict) -> dict:
+    if COMPACT_ACTIVITIES:
+        doc = {key: value for key, value in doc.items() if key != "username"}
+    return to_storage(doc)
+
+
+def restore_id(doc: dict) -> dict:
+    """Give a stored document its string `id` back and drop the Mongo `_id`"""
+    if doc is None:
+        return None
+    _id = doc.pop("_id", None)
+    if "id" not in doc and isinstance(_id, Binary) and _id.subtype == UUID_SUBTYPE:
+        doc["id"] = str(_id.as_uuid())
+    return doc
+
+
+def restore_ids(docs: List[dict]) -> List[dict]:
+    return [restore_id(doc) for doc in docs]
+
+
+async def compact_collection(collection, batch_size: int, context=None, done: int = 0) -> int:
+    """Move documents with a string `id` to binary `_id` documents, batch by batch
+
+    An original is only deleted once its copy is confirmed to exist and if it
+    is still unchanged. Documents updated while their batch was being copied
+    keep the old form and are converted by the next run of the job, as are
+    documents whose copy collides with another unique index (an open
+    ticket's copy would be a second open ticket for the same user and type).
+    """
+    last_id = None
+    while True:
+        query = {"id": {"$exists": True}, "_id": {"$type": "objectId"}}
+        if last_id is not None:
+            query["_id"]["$gt"] = last_id
+        batch = await collection.find(query).sort("_id", 1).limit(batch_size).to_list(batch_size)
+        if not batch:
+            return done
+        last_id = batch[-1]["_id"]
+
+        # Documents whose id is not a uuid stay as they are
+        pairs = []
+        for doc in batch:
+            copy = to_storage({key: value for key, value in doc.items() if key != "_id"})
+            if "_id" in copy:
+                pairs.append((doc, copy))
+        if not pairs:
+            continue
+
+        # Replacing by _id also refreshes copies left over from an interrupted run
+        try:
+            await collection.bulk_write(
+                [ReplaceOne({"_id": copy["_id"]}, copy, upsert=True) for _, copy in pairs], ordered=False
+            )
+        except BulkWriteError as e:
+            # Duplicate keys on other unique indexes leave that copy out; its
+            # original is kept below because the copy doesn't exist
+            if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+                raise
+
+        copy_ids = [copy["_id"] for _, copy in pairs]
+        copied = {
+            doc["_id"] for doc in await collection.find({"_id": {"$in": copy_ids}}, {"_id": 1}).to_list(len(copy_ids))
+        }
+        pairs = [(doc, copy) for doc, copy in pairs if copy["_id"] in copied]
+        if len(pairs) < len(copy_ids):
+            logger.info(f"{collection.name}: {len(copy_ids) - len(pairs)} documents left for a later run")
+        if not pairs:
+            continue
+
+        await collection.bulk_write([DeleteOne(doc) for doc, _ in pairs], ordered=False)
+        old_ids = [doc["_id"] for doc, _ in pairs]
+        changed = await collection.find({"_id": {"$in": old_ids}}, {"id": 1}).to_list(len(old_ids))
+        if changed:
+            # The original moved on; drop the stale copy and keep the original
+            await collection.delete_many({"_id": {"$in": [_binary_id(doc["id"]) for doc in changed]}})
+
+        done += len(pairs) - len(changed)
+        if context:
+            await context.report(done, None, {**context.checkpoint, collection.name: done})
@@ -0,0 +1,218 @@
+"""
+Coordination between uvicorn worker processes sharing one database.
+
+- WorkerLease: a lease kept in the storage backend so exactly one worker
+  acts as leader (webhook registration, scheduled jobs).
+- InvalidationBus: polled `cache_invalidations` records that keep the
+  in-process TTL caches of all workers coherent.
+
+Both go through the tenant's Storage, so they work on MongoDB and on a
+SQLite file shared by the workers.
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Iterable, List
+
+logger = logging.getLogger(__name__)
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class TTLCache:
+    """Small in-process cache with per-entry expiry and a size bound"""
+
+    def __init__(self, ttl_seconds: float, max_entries: int = 10000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: Dict[Any, tuple] = {}
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires < time.monotonic():
+            self._entries.pop(key, None)
+            return None
+        return value
+
+    def set(self, key, value):
+        if self.ttl_seconds <= 0:
+            return
+        if len(self._entries) >= self.max_entries and key not in self._entries:
+            # Drop the oldest insertion; dicts keep insertion order
+            self._entries.pop(next(iter(self._entries)), None)
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+
+    def invalidate(self, key=None):
+        """Drop one key, or everything when key is None"""
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class WorkerLease:
+    """Leader lease stored as a single record with an expiry"""
+
+    def __init__(self, storage, name: str, ttl_seconds: float = 30.0):
+        self.storage = storage
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.is_held = False
+
+    async def try_acquire(self) -> bool:
+        """Acquire or renew the lease; returns whether this worker holds it"""
+        self.is_held = await self.storage.acquire_lease(self.name, WORKER_ID, self.ttl_seconds)
+        return self.is_held
+
+    async def release(self):
+        if self.is_held:
+            await self.storage.release_lease(self.name, WORKER_ID)
+            self.is_held = False
+
+
+class LeaderElector:
+    """Keeps renewing a WorkerLease and runs leader-only work while held"""
+
+    def __init__(self, lease: WorkerLease):
+        self.lease = lease
+        self._on_acquired: List[Callable[[], Awaitable[None]]] = []
+        self._periodic: List[tuple] = []
+        self._job_tasks: List[asyncio.Task] = []
+
+    @property
+    def is_leader(self) -> bool:
+        return self.lease.is_held
+
+    def on_acquired(self, func: Callable[[], Awaitable[None]]):
+        """Register a coroutine to run each time this worker becomes leader"""
+        self._on_acquired.append(func)
+        return func
+
+    def periodic(self, interval_seconds: float):
+        """Register a coroutine to run every interval while this worker is leader"""
+        def decorator(func: Callable[[], Awaitable[None]]):
+            self._periodic.append((interval_seconds, func))
+            return func
+        return decorator
+
+    async def _run_periodic(self, interval_seconds: float, func):
+        while True:
+            await asyncio.sleep(interval_seconds)
+            try:
+                await func()
+            except Exception as e:
+                logger.error(f"Leader job {func.__name__} failed: {e}")
+
+    def _start_jobs(self):
+        for interval_seconds, func in self._periodic:
+            self._job_tasks.append(asyncio.create_task(self._run_periodic(interval_seconds, func)))
+
+    def _stop_jobs(self):
+        for task in self._job_tasks:
+            task.cancel()
+        self._job_tasks = []
+
+    async def run(self):
+        was_leader = False
+        while True:
+            try:
+                is_leader = await self.lease.try_acquire()
+            except Exception as e:
+                logger.error(f"Leader lease renewal failed: {e}")
+                is_leader = False
+                self.lease.is_held = False
+
+            if is_leader and not was_leader:
+                logger.info(f"Worker {WORKER_ID} became leader")
+                for func in self._on_acquired:
+                    try:
+                        await func()
+                    except Exception as e:
+                        logger.error(f"Leader startup task {func.__name__} failed: {e}")
+                self._start_jobs()
+            elif was_leader and not is_leader:
+                logger.warning(f"Worker {WORKER_ID} lost leadership")
+                self._stop_jobs()
+            was_leader = is_leader
+
+            await asyncio.sleep(self.lease.ttl_seconds / 3)
+
+    async def stop(self):
+        self._stop_jobs()
+        await self.lease.release()
+
+
+class InvalidationBus:
+    """Cross-worker cache invalidation through polled storage records"""
+
+    def __init__(self, storage, poll_interval: float = 1.0):
+        self.storage = storage
+        self.poll_interval = poll_interval
+        self._caches: Dict[str, TTLCache] = {}
+        self._seen: Dict[Any, datetime] = {}
+        self._since = datetime.utcnow()
+
+    def register(self, name: str, cache: TTLCache):
+        self._caches[name] = cache
+
+    async def publish(self, name: str, key=None):
+        """Invalidate locally and tell the other workers to do the same"""
+        await self.publish_many(name, [key])
+
+    async def publish_many(self, name: str, keys: Iterable, local: bool = True):
+        """Invalidate several keys with one write
+
+        local=False leaves this worker's entries alone, for writers that have
+        already applied the change to them. A failed write is logged rather
+        than raised: the change it follows is already stored, and other
+        workers' entries still expire with their TTL.
+        """
+        keys = list(keys)
+        if not keys:
+            return
+        cache = self._caches.get(name)
+        if local and cache is not None:
+            for key in keys:
+                cache.invalidate(key)
+        now = datetime.utcnow()
+        try:
+            await self.storage.publish_invalidations(
+                [{"cache": name, "key": key, "origin": WORKER_ID, "created_at": now} for key in keys]
+            )
+        except Exception as e:
+            logger.error(f"Publishing {len(keys)} {name} invalidations failed: {e}")
+
+    async def poll_once(self):
+        # Re-read a short overlap window so inserts from other workers with
+        # slightly skewed clocks are not missed; seen ids deduplicate them
+        poll_started = datetime.utcnow()
+        window_start = self._since - timedelta(seconds=5)
+        for event in await self.storage.invalidations_since(window_start, WORKER_ID):
+            if event["id"] in self._seen:
+                continue
+            self._seen[event["id"]] = event["created_at"]
+            cache = self._caches.get(event.get("cache"))
+            if cache is not None:
+                cache.invalidate(event.get("key"))
+
+        self._since = poll_started
+        self._seen = {event_id: at for event_id, at in self._seen.items() if at > window_start}
+
+    async def run(self):
+        while True:
+            try:
+                await self.poll_once()
+            except Exception as e:
+                logger.error(f"Cache invalidation poll failed: {e}")
+            await asyncio.sleep(self.poll_interval)
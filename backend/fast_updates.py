@@ -0,0 +1,62 @@
+"""
+Lightweight decoding of the common Telegram update shapes.
+
+The handlers only read from_user fields, message text and callback data, so
+text messages and callback queries are decoded into small slotted objects
+instead of the full python-telegram-bot object graph. Anything else returns
+None and is parsed with Update.de_json as before.
+"""
+
+from typing import Optional, Tuple, Union
+
+
+class FastUser:
+    __slots__ = ("id", "username", "first_name", "last_name")
+
+    def __init__(self, data: dict):
+        self.id = data["id"]
+        self.username = data.get("username")
+        self.first_name = data.get("first_name")
+        self.last_name = data.get("last_name")
+
+
+class FastMessage:
+    __slots__ = ("message_id", "chat_id", "from_user", "text")
+
+    def __init__(self, data: dict):
+        self.message_id = data.get("message_id")
+        self.chat_id = (data.get("chat") or {}).get("id")
+        self.from_user = FastUser(data["from"])
+        self.text = data["text"]
+
+
+class FastCallbackQuery:
+    __slots__ = ("id", "from_user", "data", "message", "_bot")
+
+    def __init__(self, data: dict, bot):
+        self.id = data["id"]
+        self.from_user = FastUser(data["from"])
+        self.data = data.get("data")
+        self.message = data.get("message")
+        self._bot = bot
+
+    async def answer(self, text: str = None):
+        """Answer directly through the Bot API, like CallbackQuery.answer()"""
+        return await self._bot.answer_callback_query(callback_query_id=self.id, text=text)
+
+
+def decode_update(update_data: dict, bot) -> Optional[Tuple[str, Union[FastMessage, FastCallbackQuery]]]:
+    """Return ("message" | "callback_query", object) or None to fall back"""
+    message = update_data.get("message")
+    if message is not None:
+        if isinstance(message.get("text"), str) and isinstance(message.get("from"), dict):
+            return "message", FastMessage(message)
+        return None
+
+    callback_query = update_data.get("callback_query")
+    if callback_query is not None:
+        if "id" in callback_query and isinstance(callback_query.get("from"), dict):
+            return "callback_query", FastCallbackQuery(callback_query, bot)
+        return None
+
+    return None
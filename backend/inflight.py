@@ -0,0 +1,57 @@
+"""
+In-flight update tracking for graceful shutdown.
+
+Webhook updates are handled in tasks registered here instead of request
+BackgroundTasks, so shutdown can wait for the running handlers up to a
+deadline (uvicorn has stopped taking requests by then) and report how many
+had to be cancelled.
+"""
+
+import asyncio
+import logging
+from typing import Any, Coroutine, Dict, Set
+
+logger = logging.getLogger(__name__)
+
+
+class InFlightTracker:
+    def __init__(self):
+        self.started = 0
+        self.completed = 0
+        self.cancelled = 0
+        self._tasks: Set[asyncio.Task] = set()
+
+    def spawn(self, coroutine: Coroutine) -> asyncio.Task:
+        task = asyncio.create_task(coroutine)
+        self.started += 1
+        self._tasks.add(task)
+        task.add_done_callback(self._done)
+        return task
+
+    def _done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        if task.cancelled():
+            self.cancelled += 1
+        else:
+            self.completed += 1
+
+    async def drain(self, timeout: float) -> Dict[str, int]:
+        """Wait up to timeout for running tasks, cancel the rest"""
+        completed_before = self.completed
+        pending = set(self._tasks)
+        if pending:
+            logger.info(f"Draining {len(pending)} in-flight updates (up to {timeout:.0f}s)")
+            _, pending = await asyncio.wait(pending, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.wait(pending)
+        return {"drained": self.completed - completed_before, "cancelled": len(pending)}
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "in_flight": len(self._tasks),
+            "started": self.started,
+            "completed": self.completed,
+            "cancelled": self.cancelled,
+        }
@@ -0,0 +1,188 @@
+"""
+Persistent background jobs for long-running admin operations.
+
+Jobs live in the `jobs` collection and are claimed atomically by any worker,
+so heavy maintenance runs in bounded batches outside the request handlers.
+Handlers report progress and a checkpoint through JobContext.report(); a job
+whose worker died is picked up again once its lease expires and resumes from
+the last checkpoint.
+"""
+
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from pymongo import ReturnDocument
+
+from coordination import WORKER_ID
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ("queued", "running")
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobContext:
+    def __init__(self, runner: "JobRunner", job: dict):
+        self.runner = runner
+        self.job = job
+        self.id = job["id"]
+        self.params: Dict[str, Any] = job.get("params") or {}
+        self.checkpoint: Dict[str, Any] = job.get("checkpoint") or {}
+
+    async def report(self, done: int, total: Optional[int] = None, checkpoint: Optional[dict] = None):
+        """Persist progress, renew the lease and stop if a cancel was requested"""
+        if checkpoint is not None:
+            self.checkpoint = checkpoint
+        job = await self.runner.collection.find_one_and_update(
+            {"id": self.id, "worker": WORKER_ID},
+            {"$set": {
+                "progress": {"done": done, "total": total},
+                "checkpoint": self.checkpoint,
+                "lease_expires": self.runner.lease_deadline(),
+                "updated_at": datetime.utcnow(),
+            }},
+            projection={"_id": 0, "cancel_requested": 1},
+            return_document=ReturnDocument.AFTER,
+        )
+        if job is None or job.get("cancel_requested"):
+            raise JobCancelled()
+
+
+class JobRunner:
+    def __init__(self, collection, concurrency: int = 1, poll_interval: float = 2.0, lease_seconds: float = 120.0):
+        self.collection = collection
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self._handlers: Dict[str, Callable[[JobContext], Awaitable[Any]]] = {}
+        self._wake = asyncio.Event()
+
+    def handler(self, job_type: str):
+        """Register the coroutine that runs jobs of the given type"""
+        def decorator(func: Callable[[JobContext], Awaitable[Any]]):
+            self._handlers[job_type] = func
+            return func
+        return decorator
+
+    def lease_deadline(self) -> datetime:
+        return datetime.utcnow() + timedelta(seconds=self.lease_seconds)
+
+    async def ensure_indexes(self):
+        await self.collection.create_index("id", unique=True)
+        await self.collection.create_index([("status", 1), ("created_at", 1)])
+
+    async def submit(self, job_type: str, params: Optional[dict] = None) -> dict:
+        if job_type not in self._handlers:
+            raise ValueError(f"Unknown job type '{job_type}'")
+        now = datetime.utcnow()
+        job = {
+            "id": str(uuid.uuid4()),
+            "type": job_type,
+            "status": "queued",
+            "params": params or {},
+            "progress": {"done": 0, "total": None},
+            "checkpoint": {},
+            "result": None,
+            "error": None,
+            "cancel_requested": False,
+            "worker": None,
+            "lease_expires": None,
+            "created_at": now,
+            "updated_at": now,
+        }
+        await self.collection.insert_one(job)
+        job.pop("_id", None)
+        self._wake.set()
+        return job
+
+    async def cancel(self, job_id: str) -> Optional[dict]:
+        # Queued jobs are cancelled outright; running ones stop at their next report
+        job = await self.collection.find_one_and_update(
+            {"id": job_id, "status": "queued"},
+            {"$set": {"status": "cancelled", "cancel_requested": True, "updated_at": datetime.utcnow()}},
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER,
+        )
+        if job is None:
+            job = await self.collection.find_one_and_update(
+                {"id": job_id},
+                {"$set": {"cancel_requested": True, "updated_at": datetime.utcnow()}},
+                projection={"_id": 0},
+                return_document=ReturnDocument.AFTER,
+            )
+        return job
+
+    async def _claim(self) -> Optional[dict]:
+        now = datetime.utcnow()
+        return await self.collection.find_one_and_update(
+            {
+                "type": {"$in": list(self._handlers)},
+                "cancel_requested": False,
+                "$or": [
+                    {"status": "queued"},
+                    # Resume jobs whose worker stopped renewing the lease
+                    {"status": "running", "lease_expires": {"$lt": now}},
+                ],
+            },
+            {"$set": {
+                "status": "running",
+                "worker": WORKER_ID,
+                "lease_expires": self.lease_deadline(),
+                "updated_at": now,
+            }},
+            sort=[("created_at", 1)],
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def _finish(self, job_id: str, **fields):
+        fields["updated_at"] = datetime.utcnow()
+        fields["lease_expires"] = None
+        await self.collection.update_one({"id": job_id, "worker": WORKER_ID}, {"$set": fields})
+
+    async def _execute(self, job: dict):
+        context = JobContext(self, job)
+        try:
+            result = await self._handlers[job["type"]](context)
+            await self._finish(job["id"], status="completed", result=result)
+        except JobCancelled:
+            await self._finish(job["id"], status="cancelled")
+        except Exception as e:
+            logger.error(f"Job {job['id']} ({job['type']}) failed: {e}")
+            await self._finish(job["id"], status="failed", error=str(e))
+
+    async def _worker(self):
+        while True:
+            try:
+                job = await self._claim()
+            except Exception as e:
+                logger.error(f"Failed to claim job: {e}")
+                job = None
+            if job is None:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._execute(job)
+
+    async def run(self):
+        await asyncio.gather(*(self._worker() for _ in range(self.concurrency)))
+
+
+async def delete_in_batches(context: JobContext, collection, query: dict, batch_size: int, done: int = 0, total: Optional[int] = None) -> int:
+    """Delete matching documents batch by batch, reporting progress after each"""
+    while True:
+        batch = await collection.find(query, {"_id": 1}).limit(batch_size).to_list(batch_size)
+        if not batch:
+            return done
+        result = await collection.delete_many({"_id": {"$in": [doc["_id"] for doc in batch]}})
+        done += result.deleted_count
+        await context.report(done, total, {**context.checkpoint, "deleted": done})
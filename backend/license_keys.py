@@ -0,0 +1,63 @@
+"""
+Signed license keys.
+
+New keys are 12 random characters followed by an 8 character truncated
+HMAC-SHA256 of them, so mistyped or guessed keys can be rejected in-process
+without a database lookup. Legacy 16 character keys are still accepted (and
+looked up in MongoDB) unless ACCEPT_LEGACY_LICENSE_KEYS is turned off.
+"""
+
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import string
+
+KEY_ALPHABET = string.ascii_uppercase + string.digits
+BODY_LENGTH = 12
+SIGNATURE_LENGTH = 8
+SIGNED_KEY_LENGTH = BODY_LENGTH + SIGNATURE_LENGTH
+LEGACY_KEY_LENGTH = 16
+
+
+def _secret() -> bytes:
+    return os.environ.get("LICENSE_KEY_SECRET", "").encode()
+
+
+def _accept_legacy() -> bool:
+    return os.environ.get("ACCEPT_LEGACY_LICENSE_KEYS", "true").lower() in ("1", "true", "yes")
+
+
+def _signature(body: str, secret: bytes) -> str:
+    digest = hmac.new(secret, body.encode(), hashlib.sha256).digest()
+    # Base32 only uses A-Z and 2-7, so keys stay within KEY_ALPHABET
+    return base64.b32encode(digest).decode()[:SIGNATURE_LENGTH]
+
+
+def generate_key() -> str:
+    """Signed key when LICENSE_KEY_SECRET is set, legacy random key otherwise"""
+    secret = _secret()
+    if not secret:
+        return "".join(secrets.choice(KEY_ALPHABET) for _ in range(LEGACY_KEY_LENGTH))
+    body = "".join(secrets.choice(KEY_ALPHABET) for _ in range(BODY_LENGTH))
+    return body + _signature(body, secret)
+
+
+def normalize_key(key: str) -> str:
+    return key.strip().upper()
+
+
+def is_plausible_key(key: str) -> bool:
+    """Cheap in-process check run before a key is looked up in the database"""
+    if not key or any(char not in KEY_ALPHABET for char in key):
+        return False
+    if len(key) == SIGNED_KEY_LENGTH:
+        secret = _secret()
+        if not secret:
+            return False
+        body, signature = key[:BODY_LENGTH], key[BODY_LENGTH:]
+        return hmac.compare_digest(signature, _signature(body, secret))
+    if len(key) == LEGACY_KEY_LENGTH:
+        return _accept_legacy()
+    return False
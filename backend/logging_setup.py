@@ -0,0 +1,184 @@
+"""
+Non-blocking logging for the event loop.
+
+Log calls only put the record on a queue; a QueueListener thread formats it
+and writes it to stderr, so a burst of errors never stalls request handling
+on stream I/O. Configured from the environment:
+
+    LOG_LEVEL=INFO                        root level
+    LOG_LEVELS=httpx=WARNING,telegram=INFO  per-logger levels
+    LOG_FORMAT=text|json                  json emits one object per line
+    LOG_DUPLICATE_WINDOW=60               seconds to suppress repeats of the
+                                          same warning/error (0 = off)
+    LOG_QUEUE_SIZE=10000                  records dropped beyond this backlog
+"""
+
+import atexit
+import copy
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Tuple
+
+import orjson
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return orjson.dumps(entry).decode()
+
+
+class DuplicateFilter(logging.Filter):
+    """Let one copy of a repeated warning/error through per window
+
+    The next copy after the window carries the number of suppressed repeats.
+    """
+
+    def __init__(self, window_seconds: float, min_level: int = logging.WARNING, max_keys: int = 10000):
+        super().__init__()
+        self.window_seconds = window_seconds
+        self.min_level = min_level
+        self.max_keys = max_keys
+        self.suppressed = 0
+        self._lock = threading.Lock()
+        # (logger, level, message) -> [window start, suppressed in window]
+        self._seen: Dict[Tuple[str, int, str], list] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < self.min_level:
+            return True
+        key = (record.name, record.levelno, record.getMessage())
+        now = time.monotonic()
+        with self._lock:
+            entry = self._seen.get(key)
+            if entry is not None and now - entry[0] < self.window_seconds:
+                entry[1] += 1
+                self.suppressed += 1
+                return False
+            if entry is not None and entry[1]:
+                record.msg = f"{record.getMessage()} (suppressed {entry[1]} similar messages)"
+                record.args = None
+            if len(self._seen) >= self.max_keys:
+                self._prune(now)
+            self._seen[key] = [now, 0]
+        return True
+
+    def _prune(self, now: float):
+        expired = [key for key, entry in self._seen.items() if now - entry[0] >= self.window_seconds]
+        for key in expired:
+            del self._seen[key]
+        if len(self._seen) >= self.max_keys:
+            self._seen.clear()
+
+
+_traceback_formatter = logging.Formatter()
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records instead of blocking when the queue is full"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """Render the message and traceback now, leave the layout to the listener"""
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _traceback_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def parse_levels(spec: str) -> Dict[str, str]:
+    """Parse "name=LEVEL,name=LEVEL" into a logger -> level mapping"""
+    levels = {}
+    for item in (spec or "").split(","):
+        if not item.strip():
+            continue
+        name, _, level = item.partition("=")
+        level = level.strip().upper()
+        if not name.strip() or not isinstance(logging.getLevelName(level), int):
+            raise ValueError(f"Invalid LOG_LEVELS entry '{item}'")
+        levels[name.strip()] = level
+    return levels
+
+
+class LoggingPipeline:
+    def __init__(self, handler: DroppingQueueHandler, listener: logging.handlers.QueueListener, duplicates: Optional[DuplicateFilter] = None):
+        self.handler = handler
+        self.listener = listener
+        self.duplicates = duplicates
+        self._stopped = False
+
+    def stop(self):
+        """Write out everything still queued and stop the listener thread"""
+        if not self._stopped:
+            self._stopped = True
+            self.listener.stop()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "queued": self.handler.queue.qsize(),
+            "dropped": self.handler.dropped,
+            "suppressed_duplicates": self.duplicates.suppressed if self.duplicates else 0,
+        }
+
+
+def start_pipeline(output: logging.Handler, queue_size: int, duplicates: Optional[DuplicateFilter] = None) -> LoggingPipeline:
+    """Start a listener thread writing to output; loggers get pipeline.handler"""
+    handler = DroppingQueueHandler(queue.Queue(maxsize=queue_size))
+    if duplicates is not None and duplicates.window_seconds > 0:
+        handler.addFilter(duplicates)
+    listener = logging.handlers.QueueListener(handler.queue, output, respect_handler_level=True)
+    listener.start()
+    pipeline = LoggingPipeline(handler, listener, duplicates)
+    atexit.register(pipeline.stop)
+    return pipeline
+
+
+def configure_logging() -> LoggingPipeline:
+    """Route the root logger through a queue drained by a listener thread"""
+    output = logging.StreamHandler()
+    if os.environ.get("LOG_FORMAT", "text").lower() == "json":
+        output.setFormatter(JSONFormatter())
+    else:
+        output.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+    levels = parse_levels(os.environ.get("LOG_LEVELS", ""))
+    duplicates = DuplicateFilter(float(os.environ.get("LOG_DUPLICATE_WINDOW", "60")))
+    pipeline = start_pipeline(output, int(os.environ.get("LOG_QUEUE_SIZE", "10000")), duplicates)
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(pipeline.handler)
+    root.setLevel(os.environ.get("LOG_LEVEL", "INFO").upper())
+    for name, level in levels.items():
+        logging.getLogger(name).setLevel(level)
+    return pipeline
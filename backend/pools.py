@@ -0,0 +1,176 @@
+"""
+Connection pool configuration and utilization metrics.
+
+MongoDB (Motor) and the Telegram Bot API client are both sized from the
+environment so outbound concurrency matches the worker pool instead of the
+library defaults (python-telegram-bot uses a single connection by default).
+"""
+
+import os
+import threading
+from typing import Any, Dict
+
+import httpx
+from pymongo import monitoring
+from pymongo.read_preferences import Nearest, Primary, PrimaryPreferred, Secondary, SecondaryPreferred
+from telegram.request import HTTPXRequest
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.environ.get(name, default))
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.environ.get(name, default))
+
+
+class MongoPoolMetrics(monitoring.ConnectionPoolListener):
+    """Tracks connection pool usage; callbacks run on pymongo's threads"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.open_connections = 0
+        self.checked_out = 0
+        self.peak_checked_out = 0
+        self.checkout_failures = 0
+        self.pool_clears = 0
+
+    def _adjust(self, attribute: str, delta: int):
+        with self._lock:
+            setattr(self, attribute, getattr(self, attribute) + delta)
+            if self.checked_out > self.peak_checked_out:
+                self.peak_checked_out = self.checked_out
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._adjust("pool_clears", 1)
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._adjust("open_connections", 1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._adjust("open_connections", -1)
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self._adjust("checkout_failures", 1)
+
+    def connection_checked_out(self, event):
+        self._adjust("checked_out", 1)
+
+    def connection_checked_in(self, event):
+        self._adjust("checked_out", -1)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "max_pool_size": _env_int("MONGO_MAX_POOL_SIZE", 100),
+                "open_connections": self.open_connections,
+                "checked_out": self.checked_out,
+                "peak_checked_out": self.peak_checked_out,
+                "checkout_failures": self.checkout_failures,
+                "pool_clears": self.pool_clears,
+            }
+
+
+def mongo_client_options() -> Dict[str, Any]:
+    """Keyword arguments for AsyncIOMotorClient"""
+    return {
+        "maxPoolSize": _env_int("MONGO_MAX_POOL_SIZE", 100),
+        "minPoolSize": _env_int("MONGO_MIN_POOL_SIZE", 0),
+        "maxIdleTimeMS": _env_int("MONGO_MAX_IDLE_TIME_MS", 300000),
+        "waitQueueTimeoutMS": _env_int("MONGO_WAIT_QUEUE_TIMEOUT_MS", 10000),
+        "serverSelectionTimeoutMS": _env_int("MONGO_SERVER_SELECTION_TIMEOUT_MS", 10000),
+        "connectTimeoutMS": _env_int("MONGO_CONNECT_TIMEOUT_MS", 10000),
+    }
+
+
+READ_PREFERENCE_MODES = {
+    "primary": Primary,
+    "primaryPreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondaryPreferred": SecondaryPreferred,
+    "nearest": Nearest,
+}
+
+
+def analytics_read_preference():
+    """Read preference for dashboard, export and analytics reads
+
+    ANALYTICS_READ_PREFERENCE picks the mode (default secondaryPreferred, so a
+    standalone server or an unavailable secondary falls back to the primary);
+    ANALYTICS_MAX_STALENESS_SECONDS bounds replication lag (-1 = unbounded,
+    otherwise at least 90 as required by MongoDB).
+    """
+    mode = os.environ.get("ANALYTICS_READ_PREFERENCE", "secondaryPreferred")
+    if mode not in READ_PREFERENCE_MODES:
+        raise ValueError(f"Unknown ANALYTICS_READ_PREFERENCE '{mode}'")
+    if mode == "primary":
+        return Primary()
+    return READ_PREFERENCE_MODES[mode](max_staleness=_env_int("ANALYTICS_MAX_STALENESS_SECONDS", 120))
+
+
+class InstrumentedHTTPXRequest(HTTPXRequest):
+    """HTTPXRequest that counts in-flight Bot API calls"""
+
+    def __init__(self, connection_pool_size: int, **kwargs):
+        super().__init__(connection_pool_size=connection_pool_size, **kwargs)
+        self.connection_pool_size = connection_pool_size
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.total_requests = 0
+        self.failed_requests = 0
+
+    async def do_request(self, *args, **kwargs):
+        self.in_flight += 1
+        self.total_requests += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            return await super().do_request(*args, **kwargs)
+        except Exception:
+            self.failed_requests += 1
+            raise
+        finally:
+            self.in_flight -= 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "connection_pool_size": self.connection_pool_size,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "total_requests": self.total_requests,
+            "failed_requests": self.failed_requests,
+        }
+
+
+def telegram_request() -> InstrumentedHTTPXRequest:
+    """Request layer for the Bot with pool size, timeouts and keep-alive from the environment"""
+    pool_size = _env_int("TELEGRAM_POOL_SIZE", 32)
+    return InstrumentedHTTPXRequest(
+        connection_pool_size=pool_size,
+        read_timeout=_env_float("TELEGRAM_READ_TIMEOUT", 10.0),
+        write_timeout=_env_float("TELEGRAM_WRITE_TIMEOUT", 10.0),
+        connect_timeout=_env_float("TELEGRAM_CONNECT_TIMEOUT", 5.0),
+        pool_timeout=_env_float("TELEGRAM_POOL_TIMEOUT", 5.0),
+        http_version=os.environ.get("TELEGRAM_HTTP_VERSION", "1.1"),
+        httpx_kwargs={
+            "limits": httpx.Limits(
+                max_connections=pool_size,
+                max_keepalive_connections=pool_size,
+                keepalive_expiry=_env_float("TELEGRAM_KEEPALIVE_EXPIRY", 30.0),
+            )
+        },
+    )
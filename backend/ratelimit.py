@@ -0,0 +1,133 @@
+"""
+Per-user flood protection for incoming Telegram updates.
+
+Token buckets are kept in memory per (telegram_id, budget) and checked before
+any database work. Budgets come from RATE_LIMITS, e.g.
+`default=20/60,/start=5/60,callback=30/60` (N updates per T seconds).
+"""
+
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUDGETS = "default=20/60,/start=5/60,/buy=3/300,/unlock=3/300,/license=10/300,callback=30/60"
+
+
+def parse_budgets(spec: str) -> Dict[str, Tuple[float, float]]:
+    """Parse `name=N/T` pairs into {name: (capacity, refill per second)}"""
+    budgets = {}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        name, rate = item.split("=", 1)
+        count, seconds = rate.split("/", 1)
+        budgets[name.strip()] = (float(count), float(count) / float(seconds))
+    if "default" not in budgets:
+        budgets["default"] = parse_budgets(DEFAULT_BUDGETS)["default"]
+    return budgets
+
+
+def update_rate_key(update_data: dict) -> Tuple[Optional[int], str]:
+    """Extract (telegram_id, budget name) from a raw update dict"""
+    message = update_data.get("message")
+    if message:
+        text = message.get("text") or ""
+        command = text.split(maxsplit=1)[0] if text.startswith("/") else "default"
+        return (message.get("from") or {}).get("id"), command
+    callback_query = update_data.get("callback_query")
+    if callback_query:
+        return (callback_query.get("from") or {}).get("id"), "callback"
+    return None, "default"
+
+
+class FloodLimiter:
+    """Token-bucket limiter with bounded memory and optional temporary lockout"""
+
+    def __init__(
+        self,
+        budgets: Dict[str, Tuple[float, float]],
+        max_keys: int = 100000,
+        idle_seconds: float = 600.0,
+        lock_after: int = 0,
+        lock_seconds: float = 300.0,
+    ):
+        self.budgets = budgets
+        self.max_keys = max_keys
+        self.idle_seconds = idle_seconds
+        self.lock_after = lock_after  # consecutive rejections before lockout, 0 = off
+        self.lock_seconds = lock_seconds
+        # (telegram_id, budget) -> [tokens, last refill]
+        self._buckets: "OrderedDict[tuple, list]" = OrderedDict()
+        # telegram_id -> [consecutive rejections, locked until, last rejection]
+        self._strikes: Dict[int, list] = {}
+        self._last_sweep = time.monotonic()
+        self.dropped = 0
+
+    def allow(self, telegram_id: int, budget: str = "default") -> bool:
+        now = time.monotonic()
+        self._maybe_sweep(now)
+
+        strikes = self._strikes.get(telegram_id)
+        if strikes and strikes[1] > now:
+            self.dropped += 1
+            return False
+
+        name = budget if budget in self.budgets else "default"
+        capacity, refill_rate = self.budgets[name]
+        key = (telegram_id, name)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = [capacity, now]
+            self._buckets[key] = bucket
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(capacity, bucket[0] + (now - bucket[1]) * refill_rate)
+            bucket[1] = now
+
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            if strikes:
+                del self._strikes[telegram_id]
+            return True
+
+        self.dropped += 1
+        self._strike(telegram_id, now)
+        return False
+
+    def _strike(self, telegram_id: int, now: float):
+        if not self.lock_after:
+            return
+        strikes = self._strikes.setdefault(telegram_id, [0, 0.0, now])
+        strikes[0] += 1
+        strikes[2] = now
+        if strikes[0] >= self.lock_after:
+            strikes[0] = 0
+            strikes[1] = now + self.lock_seconds
+            logger.warning(f"Flood protection locked {telegram_id} for {self.lock_seconds:.0f}s")
+
+    def _maybe_sweep(self, now: float):
+        """Evict idle buckets; buckets are kept in least-recently-used order"""
+        if now - self._last_sweep < self.idle_seconds / 4:
+            return
+        self._last_sweep = now
+        while self._buckets:
+            key, bucket = next(iter(self._buckets.items()))
+            if now - bucket[1] < self.idle_seconds:
+                break
+            self._buckets.popitem(last=False)
+        self._strikes = {
+            key: value for key, value in self._strikes.items()
+            if value[1] > now or now - value[2] < self.idle_seconds
+        }
+
+    def snapshot(self) -> Dict[str, int]:
+        return {
+            "tracked_buckets": len(self._buckets),
+            "locked_users": sum(1 for value in self._strikes.values() if value[1] > time.monotonic()),
+            "dropped_updates": self.dropped,
+        }
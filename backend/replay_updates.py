@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Replay recorded Telegram updates through the webhook update handlers.
+
+Updates recorded with RECORD_UPDATES_PATH are fed to the real handlers
+against a stand-in bot (no Telegram calls) and a scratch MongoDB database,
+at the original pace or accelerated. Per-update latency is reported for
+the updates that were handled; failed updates are counted and make the run
+exit with status 1.
+
+    python replay_updates.py updates.ndjson.1 updates.ndjson --speed 10
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from update_recorder import read_recording
+
+
+class StubBot:
+    """Stands in for telegram.Bot: records send/edit calls and optionally simulates latency
+
+    Only the Bot API methods the handlers use are stubbed; anything else
+    fails the update like an unexpected call would.
+    """
+
+    # Read by Update.de_json and the python-telegram-bot shortcuts
+    defaults = None
+    id = 0
+    username = "replay_bot"
+    first_name = "Replay"
+
+    def __init__(self, latency_seconds: float = 0.0):
+        self.latency_seconds = latency_seconds
+        self.calls = Counter()
+
+    async def _call(self, name: str):
+        self.calls[name] += 1
+        if self.latency_seconds:
+            await asyncio.sleep(self.latency_seconds)
+        return True
+
+    async def send_message(self, *args, **kwargs):
+        return await self._call("send_message")
+
+    async def edit_message_text(self, *args, **kwargs):
+        return await self._call("edit_message_text")
+
+    async def answer_callback_query(self, *args, **kwargs):
+        return await self._call("answer_callback_query")
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def replay(args):
+    # Bind every module-level client to the scratch database before importing
+    os.environ["DB_NAME"] = args.db_name
+    os.environ.setdefault("TELEGRAM_TOKEN", "0:replay")
+    os.environ.pop("TENANTS_FILE", None)
+    import server
+
+    stub_bot = StubBot(args.bot_latency_ms / 1000)
+    tenant = server.tenant_registry.default
+    tenant.bot = stub_bot
+    if args.no_rate_limit:
+        tenant.flood_limiter.allow = lambda telegram_id, budget="default": True
+    await server.ensure_indexes()
+
+    updates = list(read_recording(args.files))
+    if not updates:
+        print("No updates found")
+        return 0
+    first_received = updates[0][0]
+    latencies = []
+    failures = Counter()
+
+    async def run_one(update_data):
+        started = time.perf_counter()
+        try:
+            await server.dispatch_update(update_data)
+        except Exception as e:
+            # Failed updates are reported, not timed
+            failures[f"{type(e).__name__}: {e}"] += 1
+            return
+        latencies.append(time.perf_counter() - started)
+
+    replay_started = time.perf_counter()
+    tasks = []
+    for received_at, update_data in updates:
+        if args.speed > 0:
+            delay = (received_at - first_received) / args.speed - (time.perf_counter() - replay_started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        # Updates overlap like webhook background tasks do
+        tasks.append(asyncio.create_task(run_one(update_data)))
+    await asyncio.gather(*tasks)
+    await server.user_writes.flush()
+    elapsed = time.perf_counter() - replay_started
+
+    failed = sum(failures.values())
+    print(f"Replayed {len(updates)} updates in {elapsed:.2f}s ({len(updates) / elapsed:.1f} updates/s), {failed} failed")
+    if latencies:
+        latencies_ms = [value * 1000 for value in latencies]
+        print(
+            f"Latency ms ({len(latencies_ms)} handled): mean {statistics.mean(latencies_ms):.2f}  "
+            f"p50 {percentile(latencies_ms, 0.5):.2f}  p95 {percentile(latencies_ms, 0.95):.2f}  "
+            f"p99 {percentile(latencies_ms, 0.99):.2f}  max {max(latencies_ms):.2f}"
+        )
+    print(f"Bot API calls: {dict(stub_bot.calls)}")
+    print(f"Dropped by flood limiter: {tenant.flood_limiter.dropped}")
+    for error, count in failures.most_common(10):
+        print(f"  {count:6d}x {error}")
+
+    if server.client is not None:
+        if not args.keep_db:
+            await server.client.drop_database(args.db_name)
+        server.client.close()
+    if tenant.storage.backend == "sqlite":
+        await tenant.storage.close()
+        if not args.keep_db:
+            for suffix in ("", "-wal", "-shm"):
+                Path(f"{tenant.storage.path}{suffix}").unlink(missing_ok=True)
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="+", help="recording files, oldest first")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed multiplier, 0 = as fast as possible")
+    parser.add_argument("--db-name", default="license_system_replay", help="scratch database (dropped afterwards)")
+    parser.add_argument("--keep-db", action="store_true", help="keep the scratch database (or SQLite file) for inspection")
+    parser.add_argument("--bot-latency-ms", type=float, default=0.0, help="simulated Telegram API latency")
+    parser.add_argument("--no-rate-limit", action="store_true", help="disable per-user flood protection")
+    # Non-zero when any update failed, so a broken replay can't pass as a benchmark
+    sys.exit(1 if asyncio.run(replay(parser.parse_args())) else 0)
+
+
+if __name__ == "__main__":
+    main()
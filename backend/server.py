@@ -1,33 +1,214 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Request, BackgroundTasks
+from fastapi import FastAPI, APIRouter, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
+from starlette.middleware.gzip import GZipMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from typing import List, NamedTuple, Optional, Dict, Any
 import uuid
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import httpx
 import asyncio
 from telegram import Bot, Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest
 from telegram.ext import Application
 import json
-import secrets
-import string
 import subprocess
 
+from serialization import select_fields, list_response
+from coordination import TTLCache, WorkerLease, LeaderElector, InvalidationBus
+from pools import MongoPoolMetrics, mongo_client_options, telegram_request, analytics_read_preference
+from license_keys import generate_key, normalize_key, is_plausible_key
+from write_behind import WriteBehindBuffer
+from sessions import SessionTracker, since_days
+from jobs import JobRunner, delete_in_batches
+from archiver import LogArchiver
+from update_recorder import recorder_from_env
+from fast_updates import decode_update
+from ratelimit import FloodLimiter, parse_budgets, update_rate_key, DEFAULT_BUDGETS
+from tenants import Tenant, TenantRegistry, TenantProxy, TenantSelector, DEFAULT_TENANT, current_tenant, load_tenant_configs
+from logging_setup import configure_logging
+from inflight import InFlightTracker
+from compact_storage import COMPACT_ACTIVITIES, COMPACT_COLLECTIONS, COMPACT_IDS, compact_collection, id_query, to_storage
+from storage import storage_backend, storage_from_env
+
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# Configure logging; records are written by a background thread
+logging_pipeline = configure_logging()
+logger = logging.getLogger(__name__)
+
+# MongoDB connection, shared by all tenants; optional when every bot stores
+# its data in SQLite (STORAGE_BACKEND=sqlite)
+mongo_url = os.environ.get('MONGO_URL')
+mongo_pool_metrics = MongoPoolMetrics()
+client = AsyncIOMotorClient(mongo_url, event_listeners=[mongo_pool_metrics], **mongo_client_options()) if mongo_url else None
+
+# Telegram HTTP connection pool, shared by all tenant bots
+bot_request = telegram_request()
+
+# Every bot token is a tenant with its own database and runtime state; the
+# names below resolve against the tenant handling the current update/request
+tenant_registry = TenantRegistry()
+bot = TenantProxy(tenant_registry, "bot")
+db = TenantProxy(tenant_registry, "db")
+# Dashboard/export/analytics reads; the bot's read-modify-write paths use `db`
+analytics_db = TenantProxy(tenant_registry, "analytics_db")
+# Users, licenses, tickets and logs, on MongoDB or embedded SQLite
+storage = TenantProxy(tenant_registry, "storage")
+leader = TenantProxy(tenant_registry, "leader")
+invalidation_bus = TenantProxy(tenant_registry, "invalidation_bus")
+user_cache = TenantProxy(tenant_registry, "user_cache")
+user_writes = TenantProxy(tenant_registry, "user_writes")
+session_tracker = TenantProxy(tenant_registry, "session_tracker")
+job_runner = TenantProxy(tenant_registry, "job_runner")
+log_archiver = TenantProxy(tenant_registry, "log_archiver")
+flood_limiter = TenantProxy(tenant_registry, "flood_limiter")
+startup_state = TenantProxy(tenant_registry, "startup_state")
+
+JOB_BATCH_SIZE = int(os.environ.get('JOB_BATCH_SIZE', '500'))
+# Written behind on every update; not worth a cross-worker invalidation
+ACTIVITY_FIELDS = frozenset({"last_activity"})
+BULK_INVALIDATION_LIMIT = int(os.environ.get('BULK_INVALIDATION_LIMIT', '1000'))
+ANALYTICS_READ_PREFERENCE = analytics_read_preference()
+ARCHIVE_ROOT = Path(os.environ.get('ARCHIVE_DIR', str(ROOT_DIR / 'archive')))
+
+# Job handlers and leader jobs, registered on every tenant's runtime
+JOB_HANDLERS = {}
+LEADER_JOBS = []
+
+def job_handler(job_type: str):
+    def decorator(func):
+        JOB_HANDLERS[job_type] = func
+        return func
+    return decorator
+
+def leader_job(interval_seconds: float, mongo_only: bool = False):
+    def decorator(func):
+        LEADER_JOBS.append((interval_seconds, mongo_only, func))
+        return func
+    return decorator
+
+def build_tenant(config: dict) -> Tenant:
+    """Create a tenant's bot, database handle and runtime components"""
+    tenant = Tenant(config['name'], config)
+    tenant.bot = Bot(token=config['token'], request=bot_request)
+    on_mongo = storage_backend(config) == "mongo"
+    if on_mongo:
+        if client is None:
+            raise ValueError(f"Bot '{tenant.name}' uses the MongoDB storage backend but MONGO_URL is not set")
+        tenant.db = client[config['db_name']]
+        tenant.analytics_db = client.get_database(config['db_name'], read_preference=ANALYTICS_READ_PREFERENCE)
+    else:
+        # Everything the bot needs goes through storage; MongoDB-only
+        # features answer 501 (see require_mongo_storage)
+        tenant.db = tenant.analytics_db = None
+    tenant_db = tenant.db
+    tenant.storage = storage_from_env(config, tenant.db, tenant.analytics_db)
+    
+    # Multi-worker coordination: one leader worker does webhook setup and
+    # scheduled jobs, caches are kept coherent through an invalidation channel
+    tenant.leader = LeaderElector(WorkerLease(tenant.storage, "leader", float(os.environ.get('LEADER_LEASE_TTL', '30'))))
+    tenant.invalidation_bus = InvalidationBus(tenant.storage, float(os.environ.get('CACHE_INVALIDATION_POLL_INTERVAL', '1')))
+    tenant.user_cache = TTLCache(float(os.environ.get('USER_CACHE_TTL', '5')))
+    tenant.invalidation_bus.register("users", tenant.user_cache)
+    
+    # Coalesced last_activity/profile updates, flushed as one bulk_write.
+    # This worker's cached users already carry them; other workers re-read
+    # only users whose profile changed, as nothing reads a cached
+    # last_activity and the short cache TTL covers it
+    async def write_user_batch(batch):
+        await tenant.storage.update_users(batch)
+        changed = [telegram_id for telegram_id, fields in batch.items() if fields.keys() - ACTIVITY_FIELDS]
+        await tenant.invalidation_bus.publish_many("users", changed, local=False)
+    
+    tenant.user_writes = WriteBehindBuffer(
+        write_user_batch,
+        interval_seconds=float(os.environ.get('USER_WRITE_BEHIND_INTERVAL', '5')),
+        max_pending=int(os.environ.get('USER_WRITE_BEHIND_MAX_PENDING', '10000'))
+    )
+    
+    # Login sessions: opened by /start, closed by logout or idle timeout;
+    # kept on the user documents so every worker sees the same session
+    tenant.session_tracker = SessionTracker(
+        tenant.storage,
+        idle_timeout_seconds=float(os.environ.get('SESSION_IDLE_TIMEOUT', '1800'))
+    )
+    
+    # Persistent background jobs for heavy admin operations, and the
+    # cold-storage archive for old activity and execution logs (MongoDB only)
+    tenant.job_runner = tenant.log_archiver = None
+    if on_mongo:
+        tenant.job_runner = JobRunner(
+            tenant_db.jobs,
+            concurrency=int(os.environ.get('JOB_CONCURRENCY', '1')),
+            lease_seconds=float(os.environ.get('JOB_LEASE_SECONDS', '120'))
+        )
+        tenant.log_archiver = LogArchiver(
+            tenant_db,
+            ARCHIVE_ROOT if tenant.name == DEFAULT_TENANT else ARCHIVE_ROOT / tenant.name,
+            retention_days=float(os.environ.get('ARCHIVE_AFTER_DAYS', '90')),
+            batch_size=int(os.environ.get('ARCHIVE_BATCH_SIZE', '1000'))
+        )
+    
+    # Per-user flood protection, applied before any database work
+    tenant.flood_limiter = FloodLimiter(
+        parse_budgets(config.get('rate_limits') or os.environ.get('RATE_LIMITS', DEFAULT_BUDGETS)),
+        max_keys=int(os.environ.get('RATE_LIMIT_MAX_KEYS', '100000')),
+        idle_seconds=float(os.environ.get('RATE_LIMIT_IDLE_SECONDS', '600')),
+        lock_after=int(os.environ.get('RATE_LIMIT_LOCK_AFTER', '0')),
+        lock_seconds=float(os.environ.get('RATE_LIMIT_LOCK_SECONDS', '300'))
+    )
+    
+    # Startup steps that /api/ready waits for; they run in the background
+    tenant.startup_state = {"indexes": False, "bot": False}
+    
+    tenant.leader.on_acquired(setup_telegram_webhook)
+    for interval_seconds, mongo_only, func in LEADER_JOBS:
+        if on_mongo or not mongo_only:
+            tenant.leader.periodic(interval_seconds)(func)
+    if tenant.job_runner:
+        for job_type, func in JOB_HANDLERS.items():
+            tenant.job_runner.handler(job_type)(func)
+    return tenant
+
+# Log collections that can be cleared from the admin API
+LOG_COLLECTIONS = {"activities": "bot_activities", "executions": "script_executions"}
+
+# Webhook update handlers, drained on shutdown
+in_flight = InFlightTracker()
+
+# Docker kills the container SHUTDOWN_GRACE_PERIOD seconds after SIGTERM (10
+# unless stop_grace_period / --stop-timeout raise it). Uvicorn's connection
+# close (SHUTDOWN_CONNECTION_TIMEOUT, see entrypoint.sh), the drain and the
+# flush run one after another and must all fit in it
+SHUTDOWN_GRACE_PERIOD = float(os.environ.get('SHUTDOWN_GRACE_PERIOD', '10'))
+SHUTDOWN_CONNECTION_TIMEOUT = float(os.environ.get('SHUTDOWN_CONNECTION_TIMEOUT', '2'))
+SHUTDOWN_DRAIN_TIMEOUT = float(os.environ.get('SHUTDOWN_DRAIN_TIMEOUT', '3'))
+SHUTDOWN_FLUSH_TIMEOUT = float(os.environ.get('SHUTDOWN_FLUSH_TIMEOUT', '3'))
+
+def fit_shutdown_timeouts(drain: float, flush: float):
+    """Scale the drain and flush timeouts down to what the grace period leaves"""
+    # One second for closing the clients and exiting
+    budget = max(0.0, SHUTDOWN_GRACE_PERIOD - SHUTDOWN_CONNECTION_TIMEOUT - 1)
+    if drain + flush <= budget:
+        return drain, flush
+    scale = budget / (drain + flush)
+    logger.warning(
+        f"Shutdown drain {drain:g}s + flush {flush:g}s exceeds the {SHUTDOWN_GRACE_PERIOD:g}s grace period, "
+        f"using {drain * scale:.1f}s + {flush * scale:.1f}s"
+    )
+    return drain * scale, flush * scale
+
+SHUTDOWN_DRAIN_TIMEOUT, SHUTDOWN_FLUSH_TIMEOUT = fit_shutdown_timeouts(SHUTDOWN_DRAIN_TIMEOUT, SHUTDOWN_FLUSH_TIMEOUT)
 
-# Initialize Telegram Bot
-bot = Bot(token=os.environ['TELEGRAM_TOKEN'])
+# Optional raw update recording for replay (RECORD_UPDATES_PATH)
+update_recorder = recorder_from_env()
 
 # Create the main app without a prefix
 app = FastAPI()
@@ -76,6 +257,7 @@ class Ticket(BaseModel):
     status: str = "open"  # "open", "closed"
     message: str
     admin_response: Optional[str] = None
+    request_count: int = 1  # repeated requests coalesced into this open ticket
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
@@ -107,10 +289,36 @@ class AdminAction(BaseModel):
     action: str  # "ban", "unban", "lock", "unlock", "reset_license", "extend_license"
     value: Optional[int] = None
 
+class BulkAdminAction(BaseModel):
+    user_ids: Optional[List[str]] = None
+    filter: Optional[Dict[str, Any]] = None  # equality match on User fields
+    action: str  # same actions as AdminAction
+    value: Optional[int] = None
+
+class JobSubmit(BaseModel):
+    type: str  # "create_licenses", "clear_logs", "delete_user", "archive_logs", "compact_ids"
+    params: Dict[str, Any] = {}
+
+class AdminAudit(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    action: str
+    target: Dict[str, Any]
+    result: Dict[str, int]
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+# Field updates for admin actions that don't depend on the current user document
+USER_ACTION_UPDATES = {
+    "ban": {"is_banned": True, "is_active": False},
+    "unban": {"is_banned": False, "is_active": True},
+    "lock": {"is_locked": True},
+    "unlock": {"is_locked": False},
+    "reset_license": {"license_key": None, "license_expires": None, "script_executions": 0},
+}
+
 # Generate license key
 def generate_license_key():
-    """Generate a unique license key"""
-    return ''.join(secrets.choice(string.ascii_uppercase + string.digits) for _ in range(16))
+    """Generate a unique license key (signed when LICENSE_KEY_SECRET is set)"""
+    return generate_key()
 
 # Log bot activity
 async def log_activity(telegram_id: int, username: str, action: str, message: str):
@@ -120,11 +328,19 @@ async def log_activity(telegram_id: int, username: str, action: str, message: st
         action=action,
         message=message
     )
-    await db.bot_activities.insert_one(activity.dict())
+    await storage.insert_activity(activity.dict())
+
+# Lowercased copies of the name fields, used by the indexed prefix search
+def search_fields(username: str = None, first_name: str = None, last_name: str = None):
+    return {
+        "username_lc": (username or "").lower(),
+        "first_name_lc": (first_name or "").lower(),
+        "last_name_lc": (last_name or "").lower()
+    }
 
 # Get or create user
 async def get_or_create_user(telegram_id: int, username: str = None, first_name: str = None, last_name: str = None):
-    user = await db.users.find_one({"telegram_id": telegram_id})
+    user = user_cache.get(telegram_id) or await storage.get_user(telegram_id)
     if not user:
         user_obj = User(
             telegram_id=telegram_id, 
@@ -132,28 +348,29 @@ async def get_or_create_user(telegram_id: int, username: str = None, first_name:
             first_name=first_name,
             last_name=last_name
         )
-        await db.users.insert_one(user_obj.dict())
         user = user_obj.dict()
+        user.update(search_fields(username, first_name, last_name))
+        await storage.insert_user(user)
     else:
-        # Update user info and last activity
-        update_data = {
-            "last_activity": datetime.utcnow(),
-            "username": username,
-            "first_name": first_name,
-            "last_name": last_name
-        }
-        await db.users.update_one(
-            {"telegram_id": telegram_id},
-            {"$set": update_data}
-        )
+        # Update last activity, and profile fields only when they changed;
+        # written behind in batches rather than once per update
+        update_data = {"last_activity": datetime.utcnow()}
+        profile = {"username": username, "first_name": first_name, "last_name": last_name}
+        if any(user.get(field) != value for field, value in profile.items()):
+            update_data.update(profile)
+            update_data.update(search_fields(username, first_name, last_name))
+        user_writes.set(telegram_id, update_data)
         user.update(update_data)
+    user_cache.set(telegram_id, user)
     return user
 
 # Check if user has valid license
 async def check_user_license(telegram_id: int):
-    user = await db.users.find_one({"telegram_id": telegram_id})
+    # Read through: a cached copy may predate an activation or a ban on another worker
+    user = await storage.get_user(telegram_id)
     if not user:
         return False, "User not found", None
+    user_cache.set(telegram_id, user)
     
     if user.get('is_banned', False):
         return False, "User is banned", user
@@ -173,37 +390,135 @@ async def check_user_license(telegram_id: int):
     
     return True, "License is valid", user
 
-# Execute user script
+def remaining_executions(license_doc: dict):
+    """Executions left on a license, None when unlimited; none without a license document"""
+    if not license_doc:
+        return 0
+    if license_doc.get('max_executions', -1) < 0:
+        return None
+    return max(0, license_doc['max_executions'] - license_doc.get('executions_used', 0))
+
+def format_remaining_executions(remaining):
+    return "Unlimited" if remaining is None else str(remaining)
+
+EXECUTION_LIMIT_REACHED = "Execution limit reached"
+
+# Count one execution against the license quota
+async def consume_execution(telegram_id: int, license_key: str):
+    """Atomically use one execution
+
+    Returns (remaining executions, None) or (None, reason it was refused).
+    Fails closed: a key without a license document allows nothing.
+    """
+    if not license_key:
+        return None, "No license activated"
+    
+    # Increment only while under quota, so concurrent starts can't overshoot
+    license_doc = await storage.consume_license_execution(license_key)
+    if license_doc is None:
+        # Either the quota is used up or the license document no longer exists
+        if await storage.get_license(license_key):
+            return None, EXECUTION_LIMIT_REACHED
+        return None, "License not found"
+    
+    await storage.increment_user(telegram_id, "script_executions")
+    await invalidation_bus.publish("users", telegram_id)
+    return remaining_executions(license_doc), None
+
+# Inline keyboards, built once and reused for every message
+SCRIPT_MENU_KEYBOARD = InlineKeyboardMarkup([
+    [InlineKeyboardButton("✅ OK - Start Program", callback_data="start_program")],
+    [InlineKeyboardButton("📊 Status", callback_data="my_status")],
+    [InlineKeyboardButton("🚪 Logout", callback_data="logout")]
+])
+LICENSE_MENU_KEYBOARD = InlineKeyboardMarkup([
+    [InlineKeyboardButton("💰 Buy License", callback_data="buy_license")],
+    [InlineKeyboardButton("🔑 Activate License", callback_data="activate_license")],
+    [InlineKeyboardButton("📊 Check Status", callback_data="check_status")]
+])
+UNLOCK_KEYBOARD = InlineKeyboardMarkup([
+    [InlineKeyboardButton("🔓 Request Unlock", callback_data="request_unlock")]
+])
+
+# Keyboard kept on the message a button was pressed on; logout removes it
+CALLBACK_KEYBOARDS = {
+    "start_program": SCRIPT_MENU_KEYBOARD,
+    "my_status": SCRIPT_MENU_KEYBOARD,
+    "logout": None,
+    "buy_license": LICENSE_MENU_KEYBOARD,
+    "activate_license": LICENSE_MENU_KEYBOARD,
+    "check_status": LICENSE_MENU_KEYBOARD,
+}
+
+class EditTarget(NamedTuple):
+    """The message a callback came from, to be edited instead of replied to"""
+    chat_id: int
+    message_id: int
+    reply_markup: Optional[InlineKeyboardMarkup]
+
+def callback_edit_target(callback_query) -> Optional[EditTarget]:
+    message = callback_query.message
+    if message is None:
+        return None
+    if isinstance(message, dict):
+        # Fast-path callback queries carry the raw message
+        chat_id, message_id = (message.get("chat") or {}).get("id"), message.get("message_id")
+    else:
+        chat_id, message_id = message.chat.id, message.message_id
+    if chat_id is None or message_id is None:
+        return None
+    return EditTarget(chat_id, message_id, CALLBACK_KEYBOARDS.get(callback_query.data))
+
+async def show_screen(telegram_id: int, text: str, edit: Optional[EditTarget] = None, reply_markup=None):
+    """Edit the originating message in place, or send a new message"""
+    if edit is not None:
+        try:
+            await bot.edit_message_text(
+                chat_id=edit.chat_id,
+                message_id=edit.message_id,
+                text=text,
+                reply_markup=edit.reply_markup,
+                parse_mode='Markdown'
+            )
+            return
+        except BadRequest as e:
+            # Pressing the same button twice leaves nothing to change
+            if "message is not modified" in str(e).lower():
+                return
+            # Too old, deleted or not a text message: fall back to a new one
+            logger.debug(f"Editing message {edit.message_id} failed, sending instead: {e}")
+            if reply_markup is None:
+                # Same buttons the edited message would have had
+                reply_markup = edit.reply_markup
+    await bot.send_message(
+        chat_id=telegram_id,
+        text=text,
+        reply_markup=reply_markup,
+        parse_mode='Markdown'
+    )
+
+async def send_execution_limit_reached(telegram_id: int, edit: Optional[EditTarget] = None):
+    await show_screen(
+        telegram_id,
+        "**Execution Limit Reached**\n\nYour license has no executions left.\n\nUse `/buy` to purchase a new license.",
+        edit
+    )
+
+# Program menu shown by /start
 async def execute_user_script(telegram_id: int, user: dict):
-    """Execute the main script when user has valid license"""
+    """Log the user in and show the program menu when user has valid license
+
+    Executions are counted when the program is started from the menu.
+    """
     try:
-        # Update login time and execution count
-        await db.users.update_one(
-            {"telegram_id": telegram_id},
-            {
-                "$set": {"last_login": datetime.utcnow()},
-                "$inc": {"script_executions": 1}
-            }
-        )
+        # Update login time
+        await storage.update_user(telegram_id, {"last_login": datetime.utcnow()})
+        await session_tracker.open(telegram_id)
+        await invalidation_bus.publish("users", telegram_id)
         
-        # Log script execution
-        execution = ScriptExecution(
-            user_id=user['id'],
-            telegram_id=telegram_id,
-            license_key=user.get('license_key', ''),
-            status="success",
-            output="Script executed successfully"
-        )
-        await db.script_executions.insert_one(execution.dict())
+        license_doc = await storage.get_license(user.get('license_key'))
         
         # Send script interface
-        keyboard = [
-            [InlineKeyboardButton("✅ OK - Start Program", callback_data="start_program")],
-            [InlineKeyboardButton("📊 Status", callback_data="my_status")],
-            [InlineKeyboardButton("🚪 Logout", callback_data="logout")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
         remaining_time = user.get('license_expires') - datetime.utcnow()
         remaining_days = remaining_time.days
         remaining_hours = remaining_time.seconds // 3600
@@ -214,6 +529,7 @@ async def execute_user_script(telegram_id: int, user: dict):
 **License Status:** Active ✅
 **Remaining:** {remaining_days}d {remaining_hours}h {remaining_minutes}m
 **Executions:** {user.get('script_executions', 0)}
+**Executions left:** {format_remaining_executions(remaining_executions(license_doc))}
 **User:** @{user.get('username', 'N/A')}
 
 Click OK to start the program."""
@@ -221,32 +537,34 @@ Click OK to start the program."""
         await bot.send_message(
             chat_id=telegram_id,
             text=script_text,
-            reply_markup=reply_markup,
+            reply_markup=SCRIPT_MENU_KEYBOARD,
             parse_mode='Markdown'
         )
         
         return True
         
     except Exception as e:
-        logger.error(f"Script execution failed: {e}")
-        
-        execution = ScriptExecution(
-            user_id=user['id'],
-            telegram_id=telegram_id,
-            license_key=user.get('license_key', ''),
-            status="failed",
-            output=str(e)
-        )
-        await db.script_executions.insert_one(execution.dict())
-        
+        logger.error(f"Showing program menu failed: {e}")
         return False
 
-# Telegram webhook handler
+# Telegram webhook handlers
 @api_router.post("/telegram-webhook")
-async def telegram_webhook(request: Request, background_tasks: BackgroundTasks):
+async def telegram_webhook(request: Request):
+    return await receive_update(tenant_registry.default, request)
+
+@api_router.post("/telegram-webhook/{tenant_name}")
+async def tenant_telegram_webhook(tenant_name: str, request: Request):
+    tenant = tenant_registry.get(tenant_name)
+    if tenant is None or tenant.name == DEFAULT_TENANT:
+        raise HTTPException(status_code=404, detail="Unknown bot")
+    return await receive_update(tenant, request)
+
+async def receive_update(tenant: Tenant, request: Request):
     try:
         update_data = await request.json()
-        background_tasks.add_task(handle_telegram_update, update_data)
+        if update_recorder:
+            update_recorder.record(update_data)
+        in_flight.spawn(tenant_registry.run(tenant, handle_telegram_update, update_data))
         return {"status": "ok"}
     except Exception as e:
         logger.error(f"Webhook error: {str(e)}")
@@ -255,16 +573,34 @@ async def telegram_webhook(request: Request, background_tasks: BackgroundTasks):
 async def handle_telegram_update(update_data: dict):
     """Handle incoming Telegram updates"""
     try:
-        update = Update.de_json(update_data, bot)
-        
-        if update.message:
-            await handle_message(update.message)
-        elif update.callback_query:
-            await handle_callback_query(update.callback_query)
-            
+        await dispatch_update(update_data)
     except Exception as e:
         logger.error(f"Error handling update: {str(e)}")
 
+async def dispatch_update(update_data: dict):
+    """Route an update to its handler; errors propagate to the caller"""
+    telegram_id, budget = update_rate_key(update_data)
+    if telegram_id is not None and not flood_limiter.allow(telegram_id, budget):
+        logger.debug(f"Dropped update from {telegram_id} ({budget}): rate limited")
+        return
+    
+    # Text messages and callback queries skip the full object graph
+    decoded = decode_update(update_data, bot)
+    if decoded:
+        kind, payload = decoded
+        if kind == "message":
+            await handle_message(payload)
+        else:
+            await handle_callback_query(payload)
+        return
+    
+    update = Update.de_json(update_data, bot)
+    
+    if update.message:
+        await handle_message(update.message)
+    elif update.callback_query:
+        await handle_callback_query(update.callback_query)
+
 async def handle_message(message):
     """Handle incoming messages"""
     telegram_id = message.from_user.id
@@ -308,22 +644,24 @@ async def handle_callback_query(callback_query):
     await callback_query.answer()
     
     user = await get_or_create_user(telegram_id, username, first_name, last_name)
+    # Screens replace the message the button was pressed on
+    edit = callback_edit_target(callback_query)
     
     if data == "buy_license":
-        await handle_buy_request(telegram_id, user['id'])
+        await handle_buy_request(telegram_id, user['id'], edit)
     elif data == "check_status":
-        await handle_status_request(telegram_id, user)
+        await handle_status_request(telegram_id, user, edit)
     elif data == "start_program":
-        await handle_program_start(telegram_id, user)
+        await handle_program_start(telegram_id, user, edit)
     elif data == "my_status":
-        await handle_status_request(telegram_id, user)
+        await handle_status_request(telegram_id, user, edit)
     elif data == "logout":
-        await handle_logout(telegram_id, user)
+        await handle_logout(telegram_id, user, edit)
     elif data == "activate_license":
-        await bot.send_message(
-            chat_id=telegram_id,
-            text="**License Activation**\n\nUse: `/license activate [YOUR-LICENSE-KEY]`",
-            parse_mode='Markdown'
+        await show_screen(
+            telegram_id,
+            "**License Activation**\n\nUse: `/license activate [YOUR-LICENSE-KEY]`",
+            edit
         )
 
 async def handle_start_command(telegram_id: int, user: dict):
@@ -342,26 +680,14 @@ async def handle_start_command(telegram_id: int, user: dict):
                 parse_mode='Markdown'
             )
         elif user_data and user_data.get('is_locked'):
-            keyboard = [
-                [InlineKeyboardButton("🔓 Request Unlock", callback_data="request_unlock")]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
             await bot.send_message(
                 chat_id=telegram_id,
                 text="**Account Locked**\n\nYour account is temporarily locked. Request unlock to continue.",
-                reply_markup=reply_markup,
+                reply_markup=UNLOCK_KEYBOARD,
                 parse_mode='Markdown'
             )
         else:
             # No license or expired
-            keyboard = [
-                [InlineKeyboardButton("💰 Buy License", callback_data="buy_license")],
-                [InlineKeyboardButton("🔑 Activate License", callback_data="activate_license")],
-                [InlineKeyboardButton("📊 Check Status", callback_data="check_status")]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
             welcome_text = f"""**License System**
 
 **Status:** {message}
@@ -380,7 +706,7 @@ async def handle_start_command(telegram_id: int, user: dict):
             await bot.send_message(
                 chat_id=telegram_id,
                 text=welcome_text,
-                reply_markup=reply_markup,
+                reply_markup=LICENSE_MENU_KEYBOARD,
                 parse_mode='Markdown'
             )
 
@@ -410,59 +736,82 @@ async def show_commands(telegram_id: int):
         parse_mode='Markdown'
     )
 
-async def handle_program_start(telegram_id: int, user: dict):
-    """Handle program start button"""
-    await bot.send_message(
-        chat_id=telegram_id,
-        text="**Program Started!**\n\nYour program is now running...\n\n✅ Successful execution\n📊 Script counter updated",
-        parse_mode='Markdown'
+async def handle_program_start(telegram_id: int, user: dict, edit: Optional[EditTarget] = None):
+    """Handle program start button: the launch that counts as an execution"""
+    # The button outlives the license: re-check expiry, bans and resets first
+    is_valid, message, user_data = await check_user_license(telegram_id)
+    if not is_valid:
+        await show_license_inactive(telegram_id, message, edit)
+        return
+    
+    remaining, refused = await consume_execution(telegram_id, user_data.get('license_key'))
+    if refused == EXECUTION_LIMIT_REACHED:
+        await send_execution_limit_reached(telegram_id, edit)
+        return
+    if refused:
+        await show_license_inactive(telegram_id, refused, edit)
+        return
+    
+    # Log script execution
+    execution = ScriptExecution(
+        user_id=user_data['id'],
+        telegram_id=telegram_id,
+        license_key=user_data['license_key'],
+        status="success",
+        output="Script executed successfully"
     )
+    await storage.insert_execution(execution.dict())
     
-    # Log execution
-    await db.users.update_one(
-        {"telegram_id": telegram_id},
-        {"$inc": {"script_executions": 1}}
+    await show_screen(
+        telegram_id,
+        f"**Program Started!**\n\nYour program is now running...\n\n✅ Successful execution\n📊 Script counter updated\n🎯 Executions left: {format_remaining_executions(remaining)}",
+        edit
     )
 
-async def handle_logout(telegram_id: int, user: dict):
+async def show_license_inactive(telegram_id: int, reason: str, edit: Optional[EditTarget] = None):
+    """Replace the program menu with the reason and the license options"""
+    if edit is not None:
+        edit = edit._replace(reply_markup=LICENSE_MENU_KEYBOARD)
+    await show_screen(telegram_id, license_inactive_text(reason), edit, reply_markup=LICENSE_MENU_KEYBOARD)
+
+async def handle_logout(telegram_id: int, user: dict, edit: Optional[EditTarget] = None):
     """Handle logout"""
-    await bot.send_message(
-        chat_id=telegram_id,
-        text="**Logout Successful**\n\nYou have been logged out. Use `/start` to login again.",
-        parse_mode='Markdown'
+    if await session_tracker.close(telegram_id, "logout") is not None:
+        await invalidation_bus.publish("users", telegram_id)
+    await show_screen(
+        telegram_id,
+        "**Logout Successful**\n\nYou have been logged out. Use `/start` to login again.",
+        edit
     )
 
+async def open_ticket(user_id: str, telegram_id: int, ticket_type: str, message: str) -> dict:
+    """Create a ticket, or count the request on the user's open ticket of that type"""
+    ticket = Ticket(user_id=user_id, telegram_id=telegram_id, type=ticket_type, message=message)
+    return await storage.open_ticket(ticket.dict())
+
 async def handle_unlock_request(telegram_id: int, user_id: str):
     """Handle unlock request"""
-    ticket = Ticket(
-        user_id=user_id,
-        telegram_id=telegram_id,
-        type="unlock",
-        message="Account unlock requested"
-    )
-    await db.tickets.insert_one(ticket.dict())
+    ticket = await open_ticket(user_id, telegram_id, "unlock", "Account unlock requested")
     
+    if ticket['request_count'] > 1:
+        text = "**Unlock Already Requested!**\n\nYour unlock ticket is still open. An administrator will contact you."
+    else:
+        text = "**Unlock Requested!**\n\nYour unlock ticket has been created. An administrator will contact you."
     await bot.send_message(
         chat_id=telegram_id,
-        text="**Unlock Requested!**\n\nYour unlock ticket has been created. An administrator will contact you.",
+        text=text,
         parse_mode='Markdown'
     )
 
-async def handle_buy_request(telegram_id: int, user_id: str):
+async def handle_buy_request(telegram_id: int, user_id: str, edit: Optional[EditTarget] = None):
     """Handle license purchase request"""
-    ticket = Ticket(
-        user_id=user_id,
-        telegram_id=telegram_id,
-        type="purchase",
-        message="License purchase requested"
-    )
-    await db.tickets.insert_one(ticket.dict())
+    ticket = await open_ticket(user_id, telegram_id, "purchase", "License purchase requested")
     
-    await bot.send_message(
-        chat_id=telegram_id,
-        text="**Purchase Request Created!**\n\nYour ticket has been created. An administrator will contact you regarding the purchase.\n\n**Ticket ID:** `{}`".format(ticket.id),
-        parse_mode='Markdown'
-    )
+    if ticket['request_count'] > 1:
+        text = "**Purchase Already Requested!**\n\nYour purchase ticket is still open. An administrator will contact you regarding the purchase.\n\n**Ticket ID:** `{}`".format(ticket['id'])
+    else:
+        text = "**Purchase Request Created!**\n\nYour ticket has been created. An administrator will contact you regarding the purchase.\n\n**Ticket ID:** `{}`".format(ticket['id'])
+    await show_screen(telegram_id, text, edit)
 
 async def handle_license_command(telegram_id: int, text: str, user: dict):
     """Handle license activation command"""
@@ -476,10 +825,13 @@ async def handle_license_command(telegram_id: int, text: str, user: dict):
         )
         return
     
-    license_key = parts[2]
+    license_key = normalize_key(parts[2])
     
-    # Check if license exists and is unused
-    license_doc = await db.licenses.find_one({"license_key": license_key, "is_used": False})
+    # Reject malformed or forged keys without touching the database
+    license_doc = None
+    if is_plausible_key(license_key):
+        # Check if license exists and is unused
+        license_doc = await storage.get_license(license_key, unused_only=True)
     if not license_doc:
         await bot.send_message(
             chat_id=telegram_id,
@@ -492,31 +844,22 @@ async def handle_license_command(telegram_id: int, text: str, user: dict):
     expires_at = datetime.utcnow() + timedelta(days=license_doc['duration_days'])
     
     # Update license
-    await db.licenses.update_one(
-        {"license_key": license_key},
-        {
-            "$set": {
-                "is_used": True,
-                "used_by_user_id": user['id'],
-                "used_by_telegram_id": telegram_id,
-                "activated_at": datetime.utcnow(),
-                "expires_at": expires_at
-            }
-        }
-    )
+    await storage.update_license(license_key, {
+        "is_used": True,
+        "used_by_user_id": user['id'],
+        "used_by_telegram_id": telegram_id,
+        "activated_at": datetime.utcnow(),
+        "expires_at": expires_at
+    })
     
     # Update user
-    await db.users.update_one(
-        {"telegram_id": telegram_id},
-        {
-            "$set": {
-                "license_key": license_key,
-                "license_expires": expires_at,
-                "is_active": True,
-                "is_locked": False
-            }
-        }
-    )
+    await storage.update_user(telegram_id, {
+        "license_key": license_key,
+        "license_expires": expires_at,
+        "is_active": True,
+        "is_locked": False
+    })
+    await invalidation_bus.publish("users", telegram_id)
     
     await bot.send_message(
         chat_id=telegram_id,
@@ -524,7 +867,7 @@ async def handle_license_command(telegram_id: int, text: str, user: dict):
         parse_mode='Markdown'
     )
 
-async def handle_status_request(telegram_id: int, user: dict):
+async def handle_status_request(telegram_id: int, user: dict, edit: Optional[EditTarget] = None):
     """Handle status check request"""
     is_valid, message, user_data = await check_user_license(telegram_id)
     
@@ -534,6 +877,7 @@ async def handle_status_request(telegram_id: int, user: dict):
         remaining_days = remaining_time.days
         remaining_hours = remaining_time.seconds // 3600
         remaining_minutes = (remaining_time.seconds % 3600) // 60
+        license_doc = await storage.get_license(user_data.get('license_key'))
         
         status_text = f"""**License Status: ACTIVE**
 
@@ -541,180 +885,513 @@ async def handle_status_request(telegram_id: int, user: dict):
 📅 **Expires:** {license_expires.strftime('%d.%m.%Y %H:%M')} UTC
 ⏰ **Remaining:** {remaining_days}d {remaining_hours}h {remaining_minutes}m
 📊 **Executions:** {user_data.get('script_executions', 0)}
+🎯 **Executions left:** {format_remaining_executions(remaining_executions(license_doc))}
 👤 **User:** @{user_data.get('username', 'N/A')}
 🕐 **Last Login:** {user_data.get('last_login', 'Never').strftime('%d.%m.%Y %H:%M') if user_data.get('last_login') else 'Never'}"""
     else:
-        status_text = f"""**License Status: INACTIVE**
+        status_text = license_inactive_text(message)
+    
+    await show_screen(telegram_id, status_text, edit)
+
+def license_inactive_text(reason: str) -> str:
+    return f"""**License Status: INACTIVE**
 
-**Reason:** {message}
+**Reason:** {reason}
 
 **Actions:**
 • `/buy` - Buy new license
 • `/license activate [KEY]` - Activate license"""
-    
-    await bot.send_message(
-        chat_id=telegram_id,
-        text=status_text,
-        parse_mode='Markdown'
-    )
 
 # API Routes
 @api_router.get("/")
 async def root():
     return {"message": "Enhanced License System API Server"}
 
+@api_router.get("/health")
+async def health():
+    """Liveness: the process is up and serving requests"""
+    return {"status": "ok"}
+
+@api_router.get("/ready")
+async def ready():
+    """Readiness: MongoDB reachable (if used), indexes bootstrapped, every bot reachable"""
+    checks = {
+        step: all(tenant.startup_state[step] for tenant in tenant_registry.all())
+        for step in ("indexes", "bot")
+    }
+    if client is not None:
+        try:
+            await asyncio.wait_for(client.admin.command("ping"), timeout=2)
+            checks["mongo"] = True
+        except Exception:
+            checks["mongo"] = False
+    
+    is_ready = all(checks.values())
+    return JSONResponse(
+        status_code=200 if is_ready else 503,
+        content={"status": "ready" if is_ready else "starting", "checks": checks}
+    )
+
+@api_router.get("/tenants")
+async def get_tenants():
+    return [
+        {"name": tenant.name, "db_name": tenant.config['db_name'], "webhook_path": tenant.webhook_path}
+        for tenant in tenant_registry.all()
+    ]
+
+@api_router.get("/metrics/pools")
+async def pool_metrics():
+    return {
+        "mongo": mongo_pool_metrics.snapshot(),
+        "telegram": bot_request.snapshot(),
+        "flood_limiter": flood_limiter.snapshot(),
+        "user_write_behind": user_writes.snapshot(),
+        "updates": in_flight.snapshot(),
+        "logging": logging_pipeline.snapshot(),
+        "update_recorder": update_recorder.snapshot() if update_recorder else None
+    }
+
 @api_router.get("/users", response_model=List[User])
-async def get_users():
-    users = await db.users.find().sort("created_at", -1).to_list(1000)
-    return [User(**user) for user in users]
+async def get_users(request: Request, fields: Optional[str] = None):
+    selected = select_fields(User, fields)
+    users = await storage.list_documents("users", selected)
+    return list_response(request, User, users, selected)
+
+def require_mongo_storage(feature: str):
+    """Reject features that only exist on the MongoDB storage backend"""
+    if storage.backend != "mongo":
+        raise HTTPException(status_code=501, detail=f"{feature} requires the MongoDB storage backend")
+
+@api_router.get("/users/search", response_model=List[User])
+async def search_users(request: Request, q: str, limit: int = 25, fields: Optional[str] = None):
+    """Prefix search on names, exact match on telegram_id and license key"""
+    term = q.strip()
+    if not term:
+        raise HTTPException(status_code=400, detail="Empty search query")
+    limit = max(1, min(limit, 100))
+    
+    selected = select_fields(User, fields)
+    users = await storage.search_users(term, selected, limit)
+    return list_response(request, User, users, selected)
+
+@api_router.get("/users/{user_id}/sessions")
+async def get_user_sessions(user_id: str, days: Optional[float] = None, limit: int = 20):
+    user = await storage.get_user_by_id(user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    telegram_id = user['telegram_id']
+    stats, recent = await asyncio.gather(
+        storage.session_stats(telegram_id, since_days(days)),
+        storage.recent_sessions(telegram_id, limit)
+    )
+    
+    return {
+        "total_login_time": user.get('total_login_time', 0),
+        "active_since": user.get('session_started_at'),
+        "stats": stats,
+        "recent": recent
+    }
+
+@api_router.get("/sessions/stats")
+async def get_session_stats(days: Optional[float] = None):
+    active, stats = await asyncio.gather(
+        storage.count_open_sessions(),
+        storage.session_stats(since=since_days(days))
+    )
+    return {"active_sessions": active, "stats": stats}
 
 @api_router.get("/licenses", response_model=List[License])
-async def get_licenses():
-    licenses = await db.licenses.find().sort("created_at", -1).to_list(1000)
-    return [License(**license) for license in licenses]
+async def get_licenses(request: Request, fields: Optional[str] = None):
+    selected = select_fields(License, fields)
+    licenses = await storage.list_documents("licenses", selected)
+    return list_response(request, License, licenses, selected)
 
 @api_router.get("/tickets", response_model=List[Ticket])
-async def get_tickets():
-    tickets = await db.tickets.find().sort("created_at", -1).to_list(1000)
-    return [Ticket(**ticket) for ticket in tickets]
+async def get_tickets(request: Request, fields: Optional[str] = None):
+    selected = select_fields(Ticket, fields)
+    tickets = await storage.list_documents("tickets", selected)
+    return list_response(request, Ticket, tickets, selected)
+
+@api_router.get("/tickets/queue", response_model=List[Ticket])
+async def get_ticket_queue(
+    request: Request,
+    status: str = "open",
+    type: Optional[str] = None,
+    limit: int = 100,
+    fields: Optional[str] = None
+):
+    """Support inbox: tickets by status (and type), oldest first"""
+    limit = max(1, min(limit, 1000))
+    query = {"status": status}
+    if type:
+        query["type"] = type
+    selected = select_fields(Ticket, fields)
+    tickets = await storage.list_documents("tickets", selected, query, ascending=True, limit=limit)
+    return list_response(request, Ticket, tickets, selected)
+
+@api_router.get("/tickets/queue/stats")
+async def get_ticket_queue_stats():
+    """Open tickets per type with the age of the oldest one"""
+    groups = await storage.open_ticket_stats()
+    
+    now = datetime.utcnow()
+    by_type = {
+        group['type']: {
+            "open": group['open'],
+            "requests": group['requests'],
+            "oldest_created_at": group['oldest'],
+            "oldest_age_seconds": int((now - group['oldest']).total_seconds())
+        }
+        for group in groups
+    }
+    oldest = min((group['oldest'] for group in groups), default=None)
+    return {
+        "open": sum(stats['open'] for stats in by_type.values()),
+        "oldest_age_seconds": int((now - oldest).total_seconds()) if oldest else None,
+        "by_type": by_type
+    }
 
 @api_router.get("/activities", response_model=List[BotActivity])
-async def get_activities():
-    activities = await db.bot_activities.find().sort("timestamp", -1).limit(200).to_list(200)
-    return [BotActivity(**activity) for activity in activities]
+async def get_activities(request: Request, fields: Optional[str] = None):
+    selected = select_fields(BotActivity, fields)
+    lookup_usernames = COMPACT_ACTIVITIES and "username" in selected
+    fetched = selected + ["telegram_id"] if lookup_usernames and "telegram_id" not in selected else selected
+    activities = await storage.list_documents("bot_activities", fetched, limit=200)
+    if lookup_usernames:
+        await fill_activity_usernames(activities, keep_telegram_id="telegram_id" in selected)
+    return list_response(request, BotActivity, activities, selected)
+
+async def fill_activity_usernames(activities: List[dict], keep_telegram_id: bool = True):
+    """Look up usernames that compact activity documents no longer store"""
+    telegram_ids = list({activity['telegram_id'] for activity in activities if 'username' not in activity})
+    usernames = await storage.get_usernames(telegram_ids) if telegram_ids else {}
+    for activity in activities:
+        if 'username' not in activity:
+            activity['username'] = usernames.get(activity['telegram_id'])
+        if not keep_telegram_id:
+            activity.pop('telegram_id', None)
 
 @api_router.get("/script-executions", response_model=List[ScriptExecution])
-async def get_script_executions():
-    executions = await db.script_executions.find().sort("execution_time", -1).limit(100).to_list(100)
-    return [ScriptExecution(**execution) for execution in executions]
+async def get_script_executions(request: Request, fields: Optional[str] = None):
+    selected = select_fields(ScriptExecution, fields)
+    executions = await storage.list_documents("script_executions", selected, limit=100)
+    return list_response(request, ScriptExecution, executions, selected)
 
 @api_router.delete("/admin/user/{user_id}")
-async def delete_user(user_id: str):
-    # Delete user and all associated data
-    result = await db.users.delete_one({"id": user_id})
-    if result.deleted_count == 0:
+async def delete_user(user_id: str, background: bool = False):
+    if background:
+        require_mongo_storage("Background jobs")
+        job = await job_runner.submit("delete_user", {"user_id": user_id})
+        return {"message": "User deletion queued", "job_id": job['id']}
+    
+    # Delete the user, then everything that references it
+    deleted = await storage.delete_user(user_id)
+    if not deleted:
         raise HTTPException(status_code=404, detail="User not found")
     
-    # Delete associated tickets, activities, executions
-    await db.tickets.delete_many({"user_id": user_id})
-    await db.script_executions.delete_many({"user_id": user_id})
+    telegram_id = deleted['telegram_id']
+    forget_user(telegram_id)
+    await invalidation_bus.publish("users", telegram_id)
     
-    return {"message": "User and associated data deleted successfully"}
+    return {
+        "message": "User and associated data deleted successfully",
+        "related_deleted": deleted['related_deleted']
+    }
+
+def forget_user(telegram_id: int):
+    """Drop this worker's buffered writes for a deleted user"""
+    user_writes.discard(telegram_id)
 
 @api_router.delete("/admin/clear-logs/{log_type}")
-async def clear_logs(log_type: str):
+async def clear_logs(log_type: str, background: bool = False):
+    if background:
+        require_mongo_storage("Background jobs")
+        if log_type not in LOG_COLLECTIONS:
+            raise HTTPException(status_code=400, detail="Invalid log type")
+        job = await job_runner.submit("clear_logs", {"log_type": log_type})
+        return {"message": f"Clearing {log_type} logs queued", "job_id": job['id']}
+    
     if log_type == "activities":
-        result = await db.bot_activities.delete_many({})
-        return {"message": f"Cleared {result.deleted_count} activity logs"}
+        deleted = await storage.clear_log("bot_activities")
+        return {"message": f"Cleared {deleted} activity logs"}
     elif log_type == "executions":
-        result = await db.script_executions.delete_many({})
-        return {"message": f"Cleared {result.deleted_count} execution logs"}
+        deleted = await storage.clear_log("script_executions")
+        return {"message": f"Cleared {deleted} execution logs"}
     else:
         raise HTTPException(status_code=400, detail="Invalid log type")
 
 @api_router.post("/admin/create-licenses")
-async def create_licenses(license_data: LicenseCreate):
-    created_licenses = []
+async def create_licenses(license_data: LicenseCreate, background: bool = False):
+    if background:
+        require_mongo_storage("Background jobs")
+        job = await job_runner.submit("create_licenses", license_data.dict())
+        return {"message": f"Creation of {license_data.quantity} licenses queued", "job_id": job['id']}
     
-    for _ in range(license_data.quantity):
-        license_key = generate_license_key()
-        license_obj = License(
-            license_key=license_key,
+    created_licenses = [
+        License(
+            license_key=generate_license_key(),
             duration_days=license_data.duration_days,
             max_executions=license_data.max_executions
         )
-        await db.licenses.insert_one(license_obj.dict())
-        created_licenses.append(license_obj)
+        for _ in range(license_data.quantity)
+    ]
+    await storage.insert_licenses([license_obj.dict() for license_obj in created_licenses])
     
     return {
         "message": f"Created {license_data.quantity} licenses",
         "licenses": [{"key": lic.license_key, "duration": lic.duration_days} for lic in created_licenses]
     }
 
+# Background job handlers
+@job_handler("create_licenses")
+async def create_licenses_job(context):
+    params = context.params
+    quantity = params['quantity']
+    created_by = f"job:{context.id}"
+    # Count what earlier attempts already inserted so a resumed job doesn't overshoot
+    created = await db.licenses.count_documents({"created_by_admin": created_by})
+    
+    while created < quantity:
+        batch = [
+            License(
+                license_key=generate_license_key(),
+                duration_days=params.get('duration_days', 30.0),
+                max_executions=params.get('max_executions', -1),
+                created_by_admin=created_by
+            ).dict()
+            for _ in range(min(JOB_BATCH_SIZE, quantity - created))
+        ]
+        await db.licenses.insert_many([to_storage(doc) for doc in batch])
+        created += len(batch)
+        await context.report(created, quantity, {"created": created})
+    
+    return {"created": created, "created_by_admin": created_by}
+
+@job_handler("clear_logs")
+async def clear_logs_job(context):
+    collection = db[LOG_COLLECTIONS[context.params['log_type']]]
+    total = await collection.estimated_document_count()
+    done = context.checkpoint.get("deleted", 0)
+    deleted = await delete_in_batches(context, collection, {}, JOB_BATCH_SIZE, done, done + total)
+    return {"deleted": deleted}
+
+@job_handler("delete_user")
+async def delete_user_job(context):
+    user_id = context.params['user_id']
+    # The user document is deleted last, so a resumed job still finds it
+    user = await db.users.find_one(id_query(user_id), {"_id": 0, "telegram_id": 1})
+    telegram_id = user['telegram_id'] if user else context.checkpoint.get("telegram_id")
+    if user:
+        await context.report(context.checkpoint.get("deleted", 0), None, {**context.checkpoint, "telegram_id": telegram_id})
+    
+    deleted = context.checkpoint.get("deleted", 0)
+    deleted = await delete_in_batches(context, db.tickets, {"user_id": user_id}, JOB_BATCH_SIZE, deleted)
+    deleted = await delete_in_batches(context, db.script_executions, {"user_id": user_id}, JOB_BATCH_SIZE, deleted)
+    if telegram_id is not None:
+        deleted = await delete_in_batches(context, db.bot_activities, {"telegram_id": telegram_id}, JOB_BATCH_SIZE, deleted)
+        deleted = await delete_in_batches(context, db.user_sessions, {"telegram_id": telegram_id}, JOB_BATCH_SIZE, deleted)
+    
+    result = await db.users.delete_one(id_query(user_id))
+    if telegram_id is not None:
+        forget_user(telegram_id)
+        await invalidation_bus.publish("users", telegram_id)
+    return {"user_deleted": result.deleted_count, "related_deleted": deleted}
+
+@job_handler("compact_ids")
+async def compact_ids_job(context):
+    """Convert existing documents to binary `_id`s (COMPACT_IDS)"""
+    if not COMPACT_IDS:
+        raise ValueError("COMPACT_IDS is not enabled")
+    converted = {}
+    for name in COMPACT_COLLECTIONS:
+        converted[name] = await compact_collection(db[name], JOB_BATCH_SIZE, context, context.checkpoint.get(name, 0))
+    return {"converted": converted}
+
+@job_handler("archive_logs")
+async def archive_logs_job(context):
+    return await log_archiver.archive_all(context)
+
+@leader_job(float(os.environ.get('SESSION_IDLE_CHECK_INTERVAL', '30')))
+async def expire_idle_sessions():
+    closed = await session_tracker.expire_idle()
+    await invalidation_bus.publish_many("users", closed)
+
+@leader_job(float(os.environ.get('ARCHIVE_INTERVAL_HOURS', '6')) * 3600, mongo_only=True)
+async def archive_logs_periodically():
+    await log_archiver.archive_all()
+
+@api_router.get("/archive/{log_type}/partitions")
+async def get_archive_partitions(log_type: str):
+    require_mongo_storage("The log archive")
+    try:
+        return log_archiver.partitions(log_type)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@api_router.get("/archive/{log_type}")
+async def stream_archive(log_type: str, start: date, end: Optional[date] = None):
+    """Stream archived records for a date range as NDJSON"""
+    require_mongo_storage("The log archive")
+    if end and end < start:
+        raise HTTPException(status_code=400, detail="end must not be before start")
+    try:
+        records = log_archiver.iter_records(log_type, start, end)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(records, media_type="application/x-ndjson")
+
+@api_router.post("/admin/jobs")
+async def submit_job(job: JobSubmit):
+    require_mongo_storage("Background jobs")
+    try:
+        submitted = await job_runner.submit(job.type, job.params)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"message": f"Job '{job.type}' queued", "job_id": submitted['id']}
+
+@api_router.get("/admin/jobs")
+async def get_jobs(status: Optional[str] = None, limit: int = 50):
+    require_mongo_storage("Background jobs")
+    query = {"status": status} if status else {}
+    return await analytics_db.jobs.find(query, {"_id": 0}).sort("created_at", -1).limit(limit).to_list(limit)
+
+@api_router.get("/admin/jobs/{job_id}")
+async def get_job(job_id: str):
+    require_mongo_storage("Background jobs")
+    job = await db.jobs.find_one({"id": job_id}, {"_id": 0})
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@api_router.post("/admin/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    require_mongo_storage("Background jobs")
+    job = await job_runner.cancel(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {"message": "Job cancellation requested", "status": job['status']}
+
 @api_router.post("/admin/user-action")
 async def perform_user_action(action: AdminAction):
-    user = await db.users.find_one({"id": action.user_id})
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    update_data = {}
-    
-    if action.action == "ban":
-        update_data["is_banned"] = True
-        update_data["is_active"] = False
-    elif action.action == "unban":
-        update_data["is_banned"] = False
-        update_data["is_active"] = True
-    elif action.action == "lock":
-        update_data["is_locked"] = True
-    elif action.action == "unlock":
-        update_data["is_locked"] = False
-    elif action.action == "reset_license":
-        update_data["license_key"] = None
-        update_data["license_expires"] = None
-        update_data["script_executions"] = 0
-        # Mark old license as reset
-        if user.get('license_key'):
-            await db.licenses.update_one(
-                {"license_key": user['license_key']},
-                {"$set": {"is_reset": True}}
-            )
-    elif action.action == "extend_license":
-        if user.get('license_expires'):
-            new_expiry = user['license_expires'] + timedelta(days=action.value or 30)
-            update_data["license_expires"] = new_expiry
-        else:
-            raise HTTPException(status_code=400, detail="User has no active license to extend")
+    if action.action == "extend_license":
+        # Extend in the database, in the same round trip as the lookup
+        user = await storage.extend_user_license(action.user_id, action.value or 30)
+        if not user:
+            if await storage.get_user_by_id(action.user_id):
+                raise HTTPException(status_code=400, detail="User has no active license to extend")
+            raise HTTPException(status_code=404, detail="User not found")
+    elif action.action in USER_ACTION_UPDATES:
+        # The document before the update still has the old license key
+        user = await storage.update_user_by_id(action.user_id, USER_ACTION_UPDATES[action.action])
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+        if action.action == "reset_license" and user.get('license_key'):
+            # Mark old license as reset
+            await storage.update_license(user['license_key'], {"is_reset": True})
+    else:
+        raise HTTPException(status_code=400, detail=f"Invalid action '{action.action}'")
     
-    await db.users.update_one({"id": action.user_id}, {"$set": update_data})
+    await invalidation_bus.publish("users", user['telegram_id'])
     
     return {"message": f"Action '{action.action}' performed on user"}
 
+def validate_bulk_filter(action: BulkAdminAction) -> dict:
+    """The equality filter of a bulk action, checked against the User fields"""
+    filters = action.filter or {}
+    for field, value in filters.items():
+        if field not in User.model_fields or isinstance(value, (dict, list)):
+            raise HTTPException(status_code=400, detail=f"Invalid filter on '{field}'")
+    if not action.user_ids and not filters:
+        raise HTTPException(status_code=400, detail="Provide user_ids or a filter")
+    return filters
+
+@api_router.post("/admin/bulk-user-action")
+async def perform_bulk_user_action(action: BulkAdminAction):
+    filters = validate_bulk_filter(action)
+    if action.action == "extend_license":
+        update = {"extend_days": action.value or 30}
+    elif action.action in USER_ACTION_UPDATES:
+        update = {"fields": USER_ACTION_UPDATES[action.action], "reset_licenses": action.action == "reset_license"}
+    else:
+        raise HTTPException(status_code=400, detail=f"Invalid action '{action.action}'")
+    
+    counts = await storage.bulk_update_users(action.user_ids, filters, id_limit=BULK_INVALIDATION_LIMIT, **update)
+    # Evict just the affected users, unless that is most of the cache anyway
+    telegram_ids = counts.pop("telegram_ids")
+    if telegram_ids is None:
+        await invalidation_bus.publish("users")
+    else:
+        await invalidation_bus.publish_many("users", telegram_ids)
+    
+    audit = AdminAudit(
+        action=f"bulk_{action.action}",
+        target={"user_ids": len(action.user_ids or []), "filter": filters},
+        result=counts
+    )
+    await storage.insert_audit(audit.dict())
+    
+    return {"message": f"Bulk action '{action.action}' performed", **counts}
+
 @api_router.delete("/admin/ticket/{ticket_id}")
 async def delete_ticket(ticket_id: str):
-    result = await db.tickets.delete_one({"id": ticket_id})
-    if result.deleted_count == 0:
+    if not await storage.delete_ticket(ticket_id):
         raise HTTPException(status_code=404, detail="Ticket not found")
     return {"message": "Ticket deleted successfully"}
 
 @api_router.post("/admin/respond-ticket/{ticket_id}")
 async def respond_to_ticket(ticket_id: str, response: str):
-    result = await db.tickets.update_one(
-        {"id": ticket_id},
-        {
-            "$set": {
-                "admin_response": response,
-                "status": "closed",
-                "updated_at": datetime.utcnow()
-            }
-        }
-    )
+    # Close the ticket and get the recipient in one round trip
+    ticket = await storage.close_ticket(ticket_id, response)
     
-    if result.modified_count == 0:
+    if not ticket:
         raise HTTPException(status_code=404, detail="Ticket not found")
     
-    # Get ticket to send message to user
-    ticket = await db.tickets.find_one({"id": ticket_id})
-    if ticket:
-        message = f"**Response to your ticket:**\n\n{response}"
-        try:
-            await bot.send_message(
-                chat_id=ticket['telegram_id'],
-                text=message,
-                parse_mode='Markdown'
-            )
-        except Exception as e:
-            logger.error(f"Failed to send ticket response: {e}")
+    message = f"**Response to your ticket:**\n\n{response}"
+    try:
+        await bot.send_message(
+            chat_id=ticket['telegram_id'],
+            text=message,
+            parse_mode='Markdown'
+        )
+    except Exception as e:
+        logger.error(f"Failed to send ticket response: {e}")
     
     return {"message": "Ticket response sent"}
 
+async def ensure_indexes():
+    """Create the indexes (and SQLite schema) used by the bot and the admin API;
+    retried, backing off, until it succeeds"""
+    delay = 1
+    while not startup_state["indexes"]:
+        try:
+            # Users, licenses, tickets, logs, sessions and coordination
+            await storage.ensure_indexes()
+            if storage.backend == "mongo":
+                await job_runner.ensure_indexes()
+            startup_state["indexes"] = True
+        except Exception as e:
+            logger.error(f"Failed to create indexes, retrying in {delay}s: {e}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30)
+
+async def check_bot():
+    """Verify the bot token works; retried in the background until it does"""
+    while not startup_state["bot"]:
+        try:
+            bot_info = await bot.get_me()
+            logger.info(f"Bot info: {bot_info}")
+            startup_state["bot"] = True
+        except Exception as e:
+            logger.error(f"Telegram bot not reachable: {e}")
+            await asyncio.sleep(5)
+
 async def setup_telegram_webhook():
-    """Setup Telegram webhook"""
+    """Setup Telegram webhook for the current tenant's bot"""
     try:
-        bot_info = await bot.get_me()
-        logger.info(f"Bot info: {bot_info}")
-        
-        webhook_url = f"{os.environ.get('REACT_APP_BACKEND_URL', 'https://a0d1a663-69dc-4dcc-a21b-359c9ef7a2c3.preview.emergentagent.com')}/api/telegram-webhook"
+        tenant = tenant_registry.current()
+        backend_url = tenant.config.get('backend_url') or 'https://a0d1a663-69dc-4dcc-a21b-359c9ef7a2c3.preview.emergentagent.com'
+        webhook_url = f"{backend_url}{tenant.webhook_path}"
         
         await bot.set_webhook(url=webhook_url)
         logger.info(f"Telegram webhook set to: {webhook_url}")
@@ -726,6 +1403,10 @@ async def setup_telegram_webhook():
         logger.error(f"Failed to set Telegram webhook: {e}")
         logger.info("Continuing startup without webhook")
 
+# Build every configured tenant now that handlers and jobs are registered
+for tenant_config in load_tenant_configs():
+    tenant_registry.add(build_tenant(tenant_config))
+
 # Include the router in the main app
 app.include_router(api_router)
 
@@ -737,18 +1418,80 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+# Admin API requests pick their bot with X-Bot-Tenant or ?tenant=
+app.add_middleware(TenantSelector, registry=tenant_registry)
+
+# Compress larger responses (dashboard lists are polled every few seconds)
+app.add_middleware(
+    GZipMiddleware,
+    minimum_size=int(os.environ.get('GZIP_MINIMUM_SIZE', '1024')),
+    compresslevel=int(os.environ.get('GZIP_COMPRESS_LEVEL', '5')),
 )
-logger = logging.getLogger(__name__)
+
+service_tasks = []
 
 @app.on_event("startup")
 async def startup_event():
-    await setup_telegram_webhook()
-    logger.info("Enhanced License System Server started")
+    # Only the SQLite schema blocks serving: every handler needs its tables,
+    # creating them is quick, and a local file that cannot be opened should
+    # fail startup rather than be retried. /api/ready reports when the rest
+    # finish. Tasks copy the context they are created in, so each runs for
+    # its tenant
+    for tenant in tenant_registry.all():
+        token = current_tenant.set(tenant)
+        try:
+            if storage.backend == "sqlite":
+                await storage.ensure_indexes()
+                startup_state["indexes"] = True
+            else:
+                service_tasks.append(asyncio.create_task(ensure_indexes()))
+            service_tasks.append(asyncio.create_task(check_bot()))
+            service_tasks.append(asyncio.create_task(leader.run()))
+            service_tasks.append(asyncio.create_task(invalidation_bus.run()))
+            service_tasks.append(asyncio.create_task(user_writes.run()))
+            if tenant.job_runner:
+                service_tasks.append(asyncio.create_task(job_runner.run()))
+        finally:
+            current_tenant.reset(token)
+    logger.info(f"Enhanced License System Server started with {len(tenant_registry.all())} bot(s)")
+
+async def flush_tenant(tenant: Tenant) -> Dict[str, int]:
+    """Persist a tenant's buffered writes; returns what is still unwritten"""
+    await tenant.user_writes.flush()
+    await tenant.leader.stop()
+    await tenant.storage.close()
+    return {"user_writes": tenant.user_writes.snapshot()["pending"]}
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    # Uvicorn has stopped accepting requests and closed the connections, so
+    # no new updates arrive. 1. Let running handlers (and their sends) finish
+    drained = await in_flight.drain(SHUTDOWN_DRAIN_TIMEOUT)
+    
+    # 2. Stop background services, then flush what they would have written;
+    # all bots at once, so the flush timeout bounds the whole step
+    for task in service_tasks:
+        task.cancel()
+    await asyncio.gather(*service_tasks, return_exceptions=True)
+    
+    async def flush_within_timeout(tenant: Tenant):
+        try:
+            return await asyncio.wait_for(flush_tenant(tenant), SHUTDOWN_FLUSH_TIMEOUT)
+        except Exception as e:
+            logger.error(f"Shutdown flush for bot '{tenant.name}' failed: {e!r}")
+            return {"user_writes": tenant.user_writes.snapshot()["pending"]}
+    
+    tenants = tenant_registry.all()
+    flushed = await asyncio.gather(*(flush_within_timeout(tenant) for tenant in tenants))
+    unwritten = {tenant.name: counts for tenant, counts in zip(tenants, flushed)}
+    
+    # 3. Only now close the clients
+    dropped_writes = sum(sum(counts.values()) for counts in unwritten.values())
+    log = logger.warning if drained["cancelled"] or dropped_writes else logger.info
+    log(f"Shutdown: {drained['drained']} updates drained, {drained['cancelled']} cancelled, unwritten: {unwritten}")
+    await bot_request.shutdown()
+    if client is not None:
+        client.close()
+    if update_recorder:
+        update_recorder.stop()
+    logging_pipeline.stop()
\ No newline at end of file
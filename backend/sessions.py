@@ -0,0 +1,78 @@
+"""
+Login session tracking shared by all workers.
+
+A session is opened by a successful /start and closed by logout or after an
+idle timeout. The open session lives on the user document
+(`session_started_at`), and interactions only refresh `last_activity`, which
+is already written behind in batches. So a logout or an interaction handled
+by any worker sees the same session. Closing a session writes it to
+`user_sessions` and adds its length to `users.total_login_time` in the same
+update that ends it; idle sessions are closed by the leader.
+"""
+
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class SessionTracker:
+    def __init__(self, storage, idle_timeout_seconds: float = 1800.0, expire_batch_size: int = 500):
+        self.storage = storage
+        self.idle_timeout_seconds = idle_timeout_seconds
+        self.expire_batch_size = expire_batch_size
+
+    async def open(self, telegram_id: int):
+        """Start a session, or keep the current one"""
+        await self.storage.open_session(telegram_id, datetime.utcnow())
+
+    async def close(self, telegram_id: int, reason: str = "logout") -> Optional[float]:
+        """End the user's session now; returns its length in seconds, None if none was open"""
+        return await self.storage.close_session(telegram_id, reason, ended_at=datetime.utcnow())
+
+    async def expire_idle(self) -> List[int]:
+        """Close sessions idle for longer than the timeout; returns their telegram_ids"""
+        cutoff = datetime.utcnow() - timedelta(seconds=self.idle_timeout_seconds)
+        telegram_ids = await self.storage.idle_sessions(cutoff, self.expire_batch_size)
+        # Closing re-checks the cutoff, so a user who came back meanwhile keeps the session
+        durations = await asyncio.gather(*(
+            self.storage.close_session(telegram_id, "idle", idle_before=cutoff) for telegram_id in telegram_ids
+        ))
+        closed = [telegram_id for telegram_id, duration in zip(telegram_ids, durations) if duration is not None]
+        if closed:
+            logger.info(f"Closed {len(closed)} idle sessions")
+        return closed
+
+
+def session_record(telegram_id: int, started_at: datetime, ended_at: datetime, reason: str) -> dict:
+    return {
+        "id": str(uuid.uuid4()),
+        "telegram_id": telegram_id,
+        "started_at": started_at,
+        "ended_at": ended_at,
+        "duration_seconds": max(0.0, (ended_at - started_at).total_seconds()),
+        "end_reason": reason,
+    }
+
+
+def session_stats_pipeline(match: dict, since: datetime = None) -> list:
+    if since is not None:
+        match = {**match, "started_at": {"$gte": since}}
+    return [
+        {"$match": match},
+        {"$group": {
+            "_id": None,
+            "sessions": {"$sum": 1},
+            "total_seconds": {"$sum": "$duration_seconds"},
+            "average_seconds": {"$avg": "$duration_seconds"},
+            "longest_seconds": {"$max": "$duration_seconds"},
+        }},
+        {"$project": {"_id": 0}},
+    ]
+
+
+def since_days(days: float = None):
+    return datetime.utcnow() - timedelta(days=days) if days else None
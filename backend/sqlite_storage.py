@@ -0,0 +1,590 @@
+"""
+Embedded SQLite storage backend (STORAGE_BACKEND=sqlite).
+
+Each document is stored as JSON next to the columns it is looked up, filtered
+or sorted by, which carry the indexes. The database runs in WAL mode so the
+dashboard reads while the bot writes; every call runs on one dedicated thread
+per process, and writes use BEGIN IMMEDIATE so several uvicorn workers can
+share the file.
+"""
+
+import asyncio
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+import orjson
+
+from sessions import session_record
+from storage import EMPTY_SESSION_STATS, INVALIDATION_RETENTION_SECONDS, LIST_SORT_FIELDS, Storage
+
+# Table -> indexed columns copied out of the document
+TABLE_COLUMNS = {
+    "users": (
+        "telegram_id", "created_at", "session_started_at", "last_activity", "license_key",
+        "username_lc", "first_name_lc", "last_name_lc",
+    ),
+    "licenses": ("license_key", "created_at"),
+    "tickets": ("telegram_id", "user_id", "type", "status", "created_at"),
+    "bot_activities": ("telegram_id", "timestamp"),
+    "script_executions": ("user_id", "execution_time"),
+    "user_sessions": ("telegram_id", "started_at", "duration_seconds"),
+    "admin_audit": ("created_at",),
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id TEXT PRIMARY KEY, telegram_id INTEGER NOT NULL UNIQUE, created_at TEXT, session_started_at TEXT,
+    last_activity TEXT, license_key TEXT, username_lc TEXT, first_name_lc TEXT, last_name_lc TEXT,
+    doc TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS users_created_at ON users (created_at);
+CREATE INDEX IF NOT EXISTS users_open_sessions ON users (last_activity) WHERE session_started_at IS NOT NULL;
+CREATE INDEX IF NOT EXISTS users_license_key ON users (license_key) WHERE license_key IS NOT NULL;
+CREATE INDEX IF NOT EXISTS users_username_lc ON users (username_lc);
+CREATE INDEX IF NOT EXISTS users_first_name_lc ON users (first_name_lc);
+CREATE INDEX IF NOT EXISTS users_last_name_lc ON users (last_name_lc);
+
+CREATE TABLE IF NOT EXISTS licenses (
+    id TEXT PRIMARY KEY, license_key TEXT NOT NULL UNIQUE, created_at TEXT, doc TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS licenses_created_at ON licenses (created_at);
+
+CREATE TABLE IF NOT EXISTS tickets (
+    id TEXT PRIMARY KEY, telegram_id INTEGER, user_id TEXT, type TEXT, status TEXT, created_at TEXT,
+    doc TEXT NOT NULL);
+CREATE UNIQUE INDEX IF NOT EXISTS tickets_open_per_type ON tickets (telegram_id, type) WHERE status = 'open';
+CREATE INDEX IF NOT EXISTS tickets_queue ON tickets (status, type, created_at);
+CREATE INDEX IF NOT EXISTS tickets_created_at ON tickets (created_at);
+CREATE INDEX IF NOT EXISTS tickets_user_id ON tickets (user_id);
+
+CREATE TABLE IF NOT EXISTS bot_activities (
+    id TEXT PRIMARY KEY, telegram_id INTEGER, timestamp TEXT, doc TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS bot_activities_timestamp ON bot_activities (timestamp);
+CREATE INDEX IF NOT EXISTS bot_activities_telegram_id ON bot_activities (telegram_id);
+
+CREATE TABLE IF NOT EXISTS script_executions (
+    id TEXT PRIMARY KEY, user_id TEXT, execution_time TEXT, doc TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS script_executions_execution_time ON script_executions (execution_time);
+CREATE INDEX IF NOT EXISTS script_executions_user_id ON script_executions (user_id);
+
+CREATE TABLE IF NOT EXISTS user_sessions (
+    id TEXT PRIMARY KEY, telegram_id INTEGER, started_at TEXT, duration_seconds REAL, doc TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS user_sessions_telegram_id ON user_sessions (telegram_id, started_at);
+CREATE INDEX IF NOT EXISTS user_sessions_started_at ON user_sessions (started_at);
+
+CREATE TABLE IF NOT EXISTS admin_audit (id TEXT PRIMARY KEY, created_at TEXT, doc TEXT NOT NULL);
+
+CREATE TABLE IF NOT EXISTS worker_leases (name TEXT PRIMARY KEY, holder TEXT NOT NULL, expires_at TEXT NOT NULL);
+
+CREATE TABLE IF NOT EXISTS cache_invalidations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, cache TEXT NOT NULL, key TEXT, origin TEXT NOT NULL,
+    created_at TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS cache_invalidations_created_at ON cache_invalidations (created_at);
+"""
+
+# Model fields holding datetimes, restored from their ISO strings on read
+DATETIME_FIELDS = frozenset({
+    "created_at", "updated_at", "last_activity", "last_login", "license_expires",
+    "activated_at", "expires_at", "timestamp", "execution_time",
+    "session_started_at", "started_at", "ended_at",
+})
+
+
+def _column_value(value: Any) -> Any:
+    # Fixed-width ISO strings sort chronologically
+    if isinstance(value, datetime):
+        return value.isoformat(timespec="microseconds")
+    return value
+
+
+def _encode(doc: dict) -> str:
+    return orjson.dumps(doc).decode()
+
+
+def _decode(text: str, fields: Optional[Iterable[str]] = None) -> dict:
+    doc = orjson.loads(text)
+    if fields is not None:
+        doc = {name: doc[name] for name in fields if name in doc}
+    for name in DATETIME_FIELDS.intersection(doc):
+        if isinstance(doc[name], str):
+            doc[name] = datetime.fromisoformat(doc[name])
+    return doc
+
+
+class SQLiteStorage(Storage):
+    backend = "sqlite"
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite-storage")
+        self._connection: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Autocommit mode; transactions are opened explicitly in _write
+        connection = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute("PRAGMA busy_timeout=5000")
+        return connection
+
+    def _call(self, write: bool, func, args):
+        if self._connection is None:
+            self._connection = self._connect()
+        connection = self._connection
+        if not write:
+            return func(connection, *args)
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            result = func(connection, *args)
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+        return result
+
+    async def _read(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self._call, False, func, args)
+
+    async def _write(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self._call, True, func, args)
+
+    # Row helpers, run on the storage thread
+    @staticmethod
+    def _insert(connection, table: str, doc: dict, or_ignore: bool = False):
+        columns = ("id",) + TABLE_COLUMNS[table] + ("doc",)
+        values = [doc["id"]] + [_column_value(doc.get(name)) for name in TABLE_COLUMNS[table]] + [_encode(doc)]
+        verb = "INSERT OR IGNORE" if or_ignore else "INSERT"
+        connection.execute(
+            f"{verb} INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+            values,
+        )
+
+    @staticmethod
+    def _find(connection, table: str, column: str, value) -> Optional[dict]:
+        row = connection.execute(f"SELECT doc FROM {table} WHERE {column} = ?", (value,)).fetchone()
+        return _decode(row[0]) if row else None
+
+    @staticmethod
+    def _replace(connection, table: str, doc: dict):
+        """Write back a modified document and its indexed columns"""
+        assignments = ", ".join(f"{name} = ?" for name in TABLE_COLUMNS[table])
+        values = [_column_value(doc.get(name)) for name in TABLE_COLUMNS[table]]
+        connection.execute(f"UPDATE {table} SET {assignments}, doc = ? WHERE id = ?", values + [_encode(doc), doc["id"]])
+
+    def _update(self, connection, table: str, column: str, value, fields: dict) -> Optional[dict]:
+        """Apply a $set; returns the document as it was before"""
+        doc = self._find(connection, table, column, value)
+        if doc is None:
+            return None
+        self._replace(connection, table, {**doc, **fields})
+        return doc
+
+    @staticmethod
+    def _add_missing_columns(connection):
+        """Add indexed columns introduced after a table was created, filled from its documents"""
+        for table, columns in TABLE_COLUMNS.items():
+            existing = {row[1] for row in connection.execute(f"PRAGMA table_info({table})")}
+            if not existing:
+                # Created with every column by SCHEMA
+                continue
+            for column in columns:
+                if column in existing:
+                    continue
+                connection.execute(f"ALTER TABLE {table} ADD COLUMN {column}")
+                rows = connection.execute(f"SELECT id, doc FROM {table}").fetchall()
+                connection.executemany(
+                    f"UPDATE {table} SET {column} = ? WHERE id = ?",
+                    [(_column_value(_decode(doc).get(column)), row_id) for row_id, doc in rows],
+                )
+
+    async def ensure_indexes(self):
+        # Before SCHEMA, whose indexes may cover the new columns
+        await self._write(self._add_missing_columns)
+        await self._read(lambda connection: connection.executescript(SCHEMA))
+
+    async def close(self):
+        def close(connection):
+            connection.close()
+            self._connection = None
+
+        if self._connection is not None:
+            await self._read(close)
+        self._executor.shutdown(wait=False)
+
+    # Users
+    async def get_user(self, telegram_id: int) -> Optional[dict]:
+        return await self._read(self._find, "users", "telegram_id", telegram_id)
+
+    async def get_user_by_id(self, user_id: str) -> Optional[dict]:
+        return await self._read(self._find, "users", "id", user_id)
+
+    async def insert_user(self, user: dict):
+        await self._write(self._insert, "users", user)
+
+    async def update_user(self, telegram_id: int, fields: dict):
+        await self._write(self._update, "users", "telegram_id", telegram_id, fields)
+
+    async def update_users(self, batch: Dict[int, dict]):
+        def update_all(connection):
+            for telegram_id, fields in batch.items():
+                self._update(connection, "users", "telegram_id", telegram_id, fields)
+
+        await self._write(update_all)
+
+    async def increment_user(self, telegram_id: int, field: str, amount: int = 1):
+        def increment(connection):
+            doc = self._find(connection, "users", "telegram_id", telegram_id)
+            if doc is not None:
+                doc[field] = doc.get(field, 0) + amount
+                self._replace(connection, "users", doc)
+
+        await self._write(increment)
+
+    async def update_user_by_id(self, user_id: str, fields: dict) -> Optional[dict]:
+        return await self._write(self._update, "users", "id", user_id, fields)
+
+    async def extend_user_license(self, user_id: str, days: float) -> Optional[dict]:
+        def extend(connection):
+            doc = self._find(connection, "users", "id", user_id)
+            if doc is None or doc.get("license_expires") is None:
+                return None
+            doc["license_expires"] += timedelta(days=days)
+            self._replace(connection, "users", doc)
+            return doc
+
+        return await self._write(extend)
+
+    async def delete_user(self, user_id: str) -> Optional[dict]:
+        def delete(connection):
+            doc = self._find(connection, "users", "id", user_id)
+            if doc is None:
+                return None
+            connection.execute("DELETE FROM users WHERE id = ?", (user_id,))
+            related = 0
+            related += connection.execute("DELETE FROM tickets WHERE user_id = ?", (user_id,)).rowcount
+            related += connection.execute("DELETE FROM script_executions WHERE user_id = ?", (user_id,)).rowcount
+            related += connection.execute("DELETE FROM bot_activities WHERE telegram_id = ?", (doc["telegram_id"],)).rowcount
+            related += connection.execute("DELETE FROM user_sessions WHERE telegram_id = ?", (doc["telegram_id"],)).rowcount
+            return {"telegram_id": doc["telegram_id"], "related_deleted": related}
+
+        return await self._write(delete)
+
+    async def get_usernames(self, telegram_ids: Iterable[int]) -> Dict[int, Optional[str]]:
+        telegram_ids = list(telegram_ids)
+
+        def lookup(connection):
+            rows = connection.execute(
+                f"SELECT telegram_id, doc FROM users WHERE telegram_id IN ({', '.join('?' * len(telegram_ids))})",
+                telegram_ids,
+            ).fetchall()
+            return {telegram_id: _decode(doc).get("username") for telegram_id, doc in rows}
+
+        if not telegram_ids:
+            return {}
+        return await self._read(lookup)
+
+    async def search_users(self, term: str, fields: List[str], limit: int) -> List[dict]:
+        # Prefix ranges on the lowercased columns use their indexes
+        prefix = term.lstrip("@").lower()
+        clauses = [f"({column} >= ? AND {column} < ?)" for column in ("username_lc", "first_name_lc", "last_name_lc")]
+        values = [prefix, prefix + "\U0010ffff"] * 3
+        clauses.append("license_key = ?")
+        values.append(term.upper())
+        if term.isdigit():
+            clauses.append("telegram_id = ?")
+            values.append(int(term))
+
+        def select(connection):
+            rows = connection.execute(f"SELECT doc FROM users WHERE {' OR '.join(clauses)} LIMIT ?", [*values, limit]).fetchall()
+            return [_decode(row[0], fields) for row in rows]
+
+        return await self._read(select)
+
+    @staticmethod
+    def _user_conditions(user_ids: Optional[List[str]], filters: Dict[str, Any]):
+        """WHERE clause and values for users among user_ids that equal filters"""
+        conditions, values = [], []
+        if user_ids:
+            conditions.append(f"id IN ({', '.join('?' * len(user_ids))})")
+            values.extend(user_ids)
+        for field, value in filters.items():
+            if not field.isidentifier():
+                raise ValueError(f"Cannot filter users on '{field}'")
+            column = field if field == "id" or field in TABLE_COLUMNS["users"] else f"json_extract(doc, '$.{field}')"
+            # IS, so a None filter also matches a missing field, as on MongoDB
+            conditions.append(f"{column} IS ?")
+            values.append(_column_value(value))
+        return " AND ".join(conditions) or "1", values
+
+    async def bulk_update_users(self, user_ids, filters, fields=None, extend_days=None, reset_licenses=False, id_limit=1000):
+        where, values = self._user_conditions(user_ids, filters)
+
+        def update(connection):
+            docs = [_decode(row[0]) for row in connection.execute(f"SELECT doc FROM users WHERE {where}", values)]
+            counts = {}
+            if extend_days is not None:
+                matched = [doc for doc in docs if doc.get("license_expires") is not None]
+                counts["skipped"] = len(docs) - len(matched)
+                for doc in matched:
+                    doc["license_expires"] += timedelta(days=extend_days)
+                    self._replace(connection, "users", doc)
+                modified = len(matched)
+            else:
+                matched = docs
+                if reset_licenses:
+                    counts["licenses_reset"] = 0
+                    for license_key in {doc["license_key"] for doc in docs if doc.get("license_key") is not None}:
+                        license_doc = self._find(connection, "licenses", "license_key", license_key)
+                        if license_doc is not None and license_doc.get("is_reset") is not True:
+                            self._replace(connection, "licenses", {**license_doc, "is_reset": True})
+                            counts["licenses_reset"] += 1
+                modified = 0
+                for doc in docs:
+                    if any(doc.get(name) != value for name, value in fields.items()):
+                        self._replace(connection, "users", {**doc, **fields})
+                        modified += 1
+            telegram_ids = [doc["telegram_id"] for doc in docs] if len(docs) <= id_limit else None
+            return {"matched": len(matched), "modified": modified, **counts, "telegram_ids": telegram_ids}
+
+        return await self._write(update)
+
+    # Sessions
+    async def open_session(self, telegram_id: int, started_at: datetime):
+        def start(connection):
+            doc = self._find(connection, "users", "telegram_id", telegram_id)
+            if doc is not None and doc.get("session_started_at") is None:
+                self._replace(connection, "users", {**doc, "session_started_at": started_at, "last_activity": started_at})
+
+        await self._write(start)
+
+    async def close_session(self, telegram_id, reason, ended_at=None, idle_before=None):
+        def close(connection):
+            doc = self._find(connection, "users", "telegram_id", telegram_id)
+            if doc is None or doc.get("session_started_at") is None:
+                return None
+            if idle_before is not None:
+                # Idle sessions end with the last interaction
+                if doc.get("last_activity") is None or doc["last_activity"] >= idle_before:
+                    return None
+                end = doc["last_activity"]
+            else:
+                end = ended_at
+            session = session_record(telegram_id, doc.pop("session_started_at"), end, reason)
+            # Seconds are kept so sub-minute sessions add up; total_login_time is in minutes
+            login_seconds = doc.get("login_seconds", doc.get("total_login_time", 0) * 60) + session["duration_seconds"]
+            doc["login_seconds"] = login_seconds
+            doc["total_login_time"] = int(login_seconds // 60)
+            self._replace(connection, "users", doc)
+            self._insert(connection, "user_sessions", session)
+            return session["duration_seconds"]
+
+        return await self._write(close)
+
+    async def idle_sessions(self, before: datetime, limit: int) -> List[int]:
+        def select(connection):
+            rows = connection.execute(
+                "SELECT telegram_id FROM users WHERE session_started_at IS NOT NULL AND last_activity < ? LIMIT ?",
+                (_column_value(before), limit),
+            ).fetchall()
+            return [row[0] for row in rows]
+
+        return await self._read(select)
+
+    async def count_open_sessions(self) -> int:
+        def count(connection):
+            return connection.execute("SELECT COUNT(*) FROM users WHERE session_started_at IS NOT NULL").fetchone()[0]
+
+        return await self._read(count)
+
+    async def session_stats(self, telegram_id=None, since=None) -> dict:
+        conditions, values = [], []
+        if telegram_id is not None:
+            conditions.append("telegram_id = ?")
+            values.append(telegram_id)
+        if since is not None:
+            conditions.append("started_at >= ?")
+            values.append(_column_value(since))
+
+        def stats(connection):
+            sessions, total, average, longest = connection.execute(
+                "SELECT COUNT(*), SUM(duration_seconds), AVG(duration_seconds), MAX(duration_seconds) "
+                f"FROM user_sessions WHERE {' AND '.join(conditions) or '1'}",
+                values,
+            ).fetchone()
+            if not sessions:
+                return dict(EMPTY_SESSION_STATS)
+            return {"sessions": sessions, "total_seconds": total, "average_seconds": average, "longest_seconds": longest}
+
+        return await self._read(stats)
+
+    async def recent_sessions(self, telegram_id: int, limit: int) -> List[dict]:
+        def select(connection):
+            rows = connection.execute(
+                "SELECT doc FROM user_sessions WHERE telegram_id = ? ORDER BY started_at DESC LIMIT ?",
+                (telegram_id, limit),
+            ).fetchall()
+            return [_decode(row[0]) for row in rows]
+
+        return await self._read(select)
+
+    # Licenses
+    async def get_license(self, license_key: str, unused_only: bool = False) -> Optional[dict]:
+        doc = await self._read(self._find, "licenses", "license_key", license_key)
+        if doc is not None and unused_only and doc.get("is_used", False):
+            return None
+        return doc
+
+    async def insert_licenses(self, licenses: List[dict]):
+        def insert_all(connection):
+            for license_doc in licenses:
+                self._insert(connection, "licenses", license_doc)
+
+        await self._write(insert_all)
+
+    async def update_license(self, license_key: str, fields: dict):
+        await self._write(self._update, "licenses", "license_key", license_key, fields)
+
+    async def consume_license_execution(self, license_key: str) -> Optional[dict]:
+        def consume(connection):
+            doc = self._find(connection, "licenses", "license_key", license_key)
+            if doc is None:
+                return None
+            max_executions = doc.get("max_executions", -1)
+            used = doc.get("executions_used", 0)
+            if max_executions >= 0 and used >= max_executions:
+                return None
+            doc["executions_used"] = used + 1
+            self._replace(connection, "licenses", doc)
+            return {"max_executions": max_executions, "executions_used": used + 1}
+
+        return await self._write(consume)
+
+    # Tickets
+    async def open_ticket(self, ticket: dict) -> dict:
+        def upsert(connection):
+            row = connection.execute(
+                "SELECT doc FROM tickets WHERE telegram_id = ? AND type = ? AND status = 'open'",
+                (ticket["telegram_id"], ticket["type"]),
+            ).fetchone()
+            if row is None:
+                self._insert(connection, "tickets", {**ticket, "request_count": 1})
+                return {"id": ticket["id"], "request_count": 1}
+            doc = _decode(row[0])
+            doc["request_count"] = doc.get("request_count", 1) + 1
+            doc["updated_at"] = ticket["updated_at"]
+            self._replace(connection, "tickets", doc)
+            return {"id": doc["id"], "request_count": doc["request_count"]}
+
+        return await self._write(upsert)
+
+    async def close_ticket(self, ticket_id: str, response: str) -> Optional[dict]:
+        return await self._write(
+            self._update, "tickets", "id", ticket_id,
+            {"admin_response": response, "status": "closed", "updated_at": datetime.utcnow()},
+        )
+
+    async def delete_ticket(self, ticket_id: str) -> bool:
+        def delete(connection):
+            return connection.execute("DELETE FROM tickets WHERE id = ?", (ticket_id,)).rowcount > 0
+
+        return await self._write(delete)
+
+    async def open_ticket_stats(self) -> List[dict]:
+        def stats(connection):
+            rows = connection.execute(
+                "SELECT type, COUNT(*), SUM(COALESCE(json_extract(doc, '$.request_count'), 1)), MIN(created_at) "
+                "FROM tickets WHERE status = 'open' GROUP BY type ORDER BY type"
+            ).fetchall()
+            return [
+                {"type": ticket_type, "open": count, "requests": requests, "oldest": datetime.fromisoformat(oldest)}
+                for ticket_type, count, requests, oldest in rows
+            ]
+
+        return await self._read(stats)
+
+    # Logs
+    async def insert_activity(self, activity: dict):
+        await self._write(self._insert, "bot_activities", activity)
+
+    async def insert_execution(self, execution: dict):
+        await self._write(self._insert, "script_executions", execution)
+
+    async def clear_log(self, collection: str) -> int:
+        def clear(connection):
+            return connection.execute(f"DELETE FROM {collection}").rowcount
+
+        if collection not in ("bot_activities", "script_executions"):
+            raise ValueError(f"Not a log collection: {collection}")
+        return await self._write(clear)
+
+    async def insert_audit(self, entry: dict):
+        await self._write(self._insert, "admin_audit", entry)
+
+    # Coordination between workers
+    async def acquire_lease(self, name: str, holder: str, ttl_seconds: float) -> bool:
+        def acquire(connection):
+            now = datetime.utcnow()
+            row = connection.execute("SELECT holder, expires_at FROM worker_leases WHERE name = ?", (name,)).fetchone()
+            if row is not None and row[0] != holder and row[1] >= _column_value(now):
+                return False
+            connection.execute(
+                "INSERT OR REPLACE INTO worker_leases (name, holder, expires_at) VALUES (?, ?, ?)",
+                (name, holder, _column_value(now + timedelta(seconds=ttl_seconds))),
+            )
+            return True
+
+        return await self._write(acquire)
+
+    async def release_lease(self, name: str, holder: str):
+        def release(connection):
+            connection.execute("DELETE FROM worker_leases WHERE name = ? AND holder = ?", (name, holder))
+
+        await self._write(release)
+
+    async def publish_invalidations(self, events: List[dict]):
+        def publish(connection):
+            connection.executemany(
+                "INSERT INTO cache_invalidations (cache, key, origin, created_at) VALUES (?, ?, ?, ?)",
+                [
+                    (event["cache"], _encode(event["key"]), event["origin"], _column_value(event["created_at"]))
+                    for event in events
+                ],
+            )
+            # No TTL indexes here; expire old records as new ones come in
+            cutoff = datetime.utcnow() - timedelta(seconds=INVALIDATION_RETENTION_SECONDS)
+            connection.execute("DELETE FROM cache_invalidations WHERE created_at < ?", (_column_value(cutoff),))
+
+        await self._write(publish)
+
+    async def invalidations_since(self, since: datetime, exclude_origin: str) -> List[dict]:
+        def select(connection):
+            rows = connection.execute(
+                "SELECT id, cache, key, created_at FROM cache_invalidations WHERE created_at > ? AND origin != ?",
+                (_column_value(since), exclude_origin),
+            ).fetchall()
+            return [
+                {"id": event_id, "cache": cache, "key": orjson.loads(key), "created_at": datetime.fromisoformat(created_at)}
+                for event_id, cache, key, created_at in rows
+            ]
+
+        return await self._read(select)
+
+    # Dashboard lists
+    async def list_documents(self, collection, fields, filters=None, ascending=False, limit=1000):
+        filters = filters or {}
+        unknown = [name for name in filters if name not in TABLE_COLUMNS[collection]]
+        if unknown:
+            raise ValueError(f"Cannot filter {collection} on {', '.join(unknown)}")
+
+        def select(connection):
+            where = " AND ".join(f"{name} = ?" for name in filters) or "1"
+            order = "ASC" if ascending else "DESC"
+            rows = connection.execute(
+                f"SELECT doc FROM {collection} WHERE {where} ORDER BY {LIST_SORT_FIELDS[collection]} {order} LIMIT ?",
+                [*filters.values(), limit],
+            ).fetchall()
+            return [_decode(row[0], fields) for row in rows]
+
+        return await self._read(select)
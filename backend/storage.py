@@ -0,0 +1,648 @@
+"""
+Storage interface for users, licenses, tickets, activities, executions and
+sessions, plus the leader lease and cache invalidations the workers share.
+
+Bot handlers and the dashboard go through a Storage object instead of Motor
+collections, so the backend is selectable with STORAGE_BACKEND:
+
+    mongo   (default) MongoDB through the shared Motor client
+    sqlite  embedded SQLite in WAL mode (SQLITE_DIR), see sqlite_storage.py
+
+Documents go in and come out in their API form (string `id`, no `_id`).
+Jobs and the archive stay MongoDB features and are not part of this
+interface; MONGO_URL is only needed when a bot uses the mongo backend.
+"""
+
+import asyncio
+import logging
+import os
+import re
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from compact_storage import activity_to_storage, id_in_query, id_query, restore_id, to_storage
+from serialization import build_projection
+from sessions import session_record, session_stats_pipeline
+
+logger = logging.getLogger(__name__)
+
+STORAGE_BACKENDS = ("mongo", "sqlite")
+
+# Collection -> field the dashboard lists are sorted by
+LIST_SORT_FIELDS = {
+    "users": "created_at",
+    "licenses": "created_at",
+    "tickets": "created_at",
+    "bot_activities": "timestamp",
+    "script_executions": "execution_time",
+}
+
+EMPTY_SESSION_STATS = {"sessions": 0, "total_seconds": 0}
+
+# How long cache invalidation records are kept for polling workers
+INVALIDATION_RETENTION_SECONDS = 3600
+
+
+class Storage(ABC):
+    """Operations the bot and the admin API perform on their documents"""
+
+    backend = None
+
+    @abstractmethod
+    async def ensure_indexes(self):
+        ...
+
+    async def close(self):
+        pass
+
+    # Users
+    @abstractmethod
+    async def get_user(self, telegram_id: int) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    async def get_user_by_id(self, user_id: str) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    async def insert_user(self, user: dict):
+        ...
+
+    @abstractmethod
+    async def update_user(self, telegram_id: int, fields: dict):
+        """$set fields on a user"""
+
+    @abstractmethod
+    async def update_users(self, batch: Dict[int, dict]):
+        """$set fields on many users (telegram_id -> fields), e.g. write-behind flushes"""
+
+    @abstractmethod
+    async def increment_user(self, telegram_id: int, field: str, amount: int = 1):
+        ...
+
+    @abstractmethod
+    async def update_user_by_id(self, user_id: str, fields: dict) -> Optional[dict]:
+        """$set fields on a user; returns the user as it was before"""
+
+    @abstractmethod
+    async def extend_user_license(self, user_id: str, days: float) -> Optional[dict]:
+        """Push license_expires back; None if the user is missing or has no license"""
+
+    @abstractmethod
+    async def delete_user(self, user_id: str) -> Optional[dict]:
+        """Delete a user with its tickets, executions, activities and sessions
+
+        Returns {"telegram_id", "related_deleted"}, or None if there was no user.
+        """
+
+    @abstractmethod
+    async def get_usernames(self, telegram_ids: Iterable[int]) -> Dict[int, Optional[str]]:
+        ...
+
+    @abstractmethod
+    async def search_users(self, term: str, fields: List[str], limit: int) -> List[dict]:
+        """Prefix match on the lowercased names, exact match on the license key
+        and, for digits, telegram_id; with only fields"""
+
+    @abstractmethod
+    async def bulk_update_users(
+        self,
+        user_ids: Optional[List[str]],
+        filters: Dict[str, Any],
+        fields: Optional[dict] = None,
+        extend_days: Optional[float] = None,
+        reset_licenses: bool = False,
+        id_limit: int = 1000,
+    ) -> dict:
+        """$set fields on, or extend the licenses of, the users among user_ids
+        (when given) that equal filters
+
+        Extending skips users without a license; reset_licenses first marks
+        the users' licenses reset. Returns the counts ("matched", "modified",
+        "skipped" or "licenses_reset") and "telegram_ids" of the matched
+        users, None when more than id_limit matched.
+        """
+
+    # Sessions, open on the user document while `session_started_at` is set
+    @abstractmethod
+    async def open_session(self, telegram_id: int, started_at: datetime):
+        """Open a session unless one is already open"""
+
+    @abstractmethod
+    async def close_session(
+        self,
+        telegram_id: int,
+        reason: str,
+        ended_at: Optional[datetime] = None,
+        idle_before: Optional[datetime] = None,
+    ) -> Optional[float]:
+        """End the open session, record it and add it to total_login_time
+
+        With idle_before, only closes a session whose last_activity is older,
+        ending it at last_activity. Returns the length in seconds, None if no
+        session was closed.
+        """
+
+    @abstractmethod
+    async def idle_sessions(self, before: datetime, limit: int) -> List[int]:
+        """telegram_ids with an open session and last_activity older than before"""
+
+    @abstractmethod
+    async def count_open_sessions(self) -> int:
+        ...
+
+    @abstractmethod
+    async def session_stats(self, telegram_id: Optional[int] = None, since: Optional[datetime] = None) -> dict:
+        """Closed sessions: count, total, average and longest seconds"""
+
+    @abstractmethod
+    async def recent_sessions(self, telegram_id: int, limit: int) -> List[dict]:
+        ...
+
+    # Licenses
+    @abstractmethod
+    async def get_license(self, license_key: str, unused_only: bool = False) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    async def insert_licenses(self, licenses: List[dict]):
+        ...
+
+    @abstractmethod
+    async def update_license(self, license_key: str, fields: dict):
+        ...
+
+    @abstractmethod
+    async def consume_license_execution(self, license_key: str) -> Optional[dict]:
+        """Use one execution while under quota; returns max/used after, None otherwise"""
+
+    # Tickets
+    @abstractmethod
+    async def open_ticket(self, ticket: dict) -> dict:
+        """Insert the ticket, or count a request on the open one of its user and type
+
+        Returns {"id", "request_count"} of the open ticket.
+        """
+
+    @abstractmethod
+    async def close_ticket(self, ticket_id: str, response: str) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    async def delete_ticket(self, ticket_id: str) -> bool:
+        ...
+
+    @abstractmethod
+    async def open_ticket_stats(self) -> List[dict]:
+        """Per type: {"type", "open", "requests", "oldest"}"""
+
+    # Logs
+    @abstractmethod
+    async def insert_activity(self, activity: dict):
+        ...
+
+    @abstractmethod
+    async def insert_execution(self, execution: dict):
+        ...
+
+    @abstractmethod
+    async def clear_log(self, collection: str) -> int:
+        ...
+
+    @abstractmethod
+    async def insert_audit(self, entry: dict):
+        ...
+
+    # Coordination between workers
+    @abstractmethod
+    async def acquire_lease(self, name: str, holder: str, ttl_seconds: float) -> bool:
+        """Take the lease if it is free or expired, or renew it for its holder"""
+
+    @abstractmethod
+    async def release_lease(self, name: str, holder: str):
+        ...
+
+    @abstractmethod
+    async def publish_invalidations(self, events: List[dict]):
+        """Store {"cache", "key", "origin", "created_at"} records"""
+
+    @abstractmethod
+    async def invalidations_since(self, since: datetime, exclude_origin: str) -> List[dict]:
+        """Records newer than since from other origins, each with a unique `id`"""
+
+    # Dashboard lists
+    @abstractmethod
+    async def list_documents(
+        self,
+        collection: str,
+        fields: List[str],
+        filters: Optional[Dict[str, Any]] = None,
+        ascending: bool = False,
+        limit: int = 1000,
+    ) -> List[dict]:
+        """Equality-filtered documents, sorted by LIST_SORT_FIELDS, with only fields"""
+
+
+class MongoStorage(Storage):
+    backend = "mongo"
+
+    def __init__(self, db, analytics_db):
+        self.db = db
+        # Dashboard reads may go to secondaries
+        self.analytics_db = analytics_db
+
+    async def ensure_indexes(self):
+        db = self.db
+        await db.users.create_index("telegram_id")
+        # Only documents not yet converted to a binary _id carry a string id,
+        # so this index empties as the compact_ids job runs. It replaces the
+        # full "id_1" index, which gave every compact document a null entry
+        await db.users.create_index("id", name="id_present", partialFilterExpression={"id": {"$exists": True}})
+        if "id_1" in await db.users.index_information():
+            await db.users.drop_index("id_1")
+        await db.users.create_index("license_key", sparse=True)
+        await db.users.create_index([("created_at", -1)])
+        for field in ("username_lc", "first_name_lc", "last_name_lc"):
+            await db.users.create_index(field)
+        # Only users with an open session carry the field
+        await db.users.create_index("session_started_at", sparse=True)
+        await db.user_sessions.create_index([("telegram_id", 1), ("started_at", -1)])
+        await db.user_sessions.create_index("started_at")
+        await db.licenses.create_index("license_key")
+        await db.tickets.create_index([("status", 1), ("created_at", 1)])
+        await db.tickets.create_index([("status", 1), ("type", 1), ("created_at", 1)])
+        await self._ensure_open_ticket_index()
+        await db.bot_activities.create_index("timestamp")
+        await db.script_executions.create_index("execution_time")
+        await db.cache_invalidations.create_index("created_at", expireAfterSeconds=INVALIDATION_RETENTION_SECONDS)
+
+        # Backfill search fields for users created before they existed
+        result = await db.users.update_many(
+            {"username_lc": {"$exists": False}},
+            [{"$set": {
+                "username_lc": {"$toLower": {"$ifNull": ["$username", ""]}},
+                "first_name_lc": {"$toLower": {"$ifNull": ["$first_name", ""]}},
+                "last_name_lc": {"$toLower": {"$ifNull": ["$last_name", ""]}}
+            }}]
+        )
+        if result.modified_count:
+            logger.info(f"Backfilled search fields for {result.modified_count} users")
+
+    async def _ensure_open_ticket_index(self):
+        """One open ticket per user and type; older duplicates are closed first"""
+        tickets = self.db.tickets
+        duplicates = await tickets.aggregate([
+            {"$match": {"status": "open"}},
+            {"$sort": {"created_at": 1}},
+            {"$group": {
+                "_id": {"telegram_id": "$telegram_id", "type": "$type"},
+                "tickets": {"$push": "$_id"},
+                "requests": {"$sum": {"$ifNull": ["$request_count", 1]}},
+                "count": {"$sum": 1}
+            }},
+            {"$match": {"count": {"$gt": 1}}}
+        ], allowDiskUse=True).to_list(None)
+
+        for group in duplicates:
+            keep, merged = group["tickets"][0], group["tickets"][1:]
+            await tickets.update_one({"_id": keep}, {"$set": {"request_count": group["requests"]}})
+            await tickets.update_many(
+                {"_id": {"$in": merged}},
+                {"$set": {"status": "closed", "admin_response": "Merged into an earlier open ticket", "updated_at": datetime.utcnow()}}
+            )
+        if duplicates:
+            logger.info(f"Coalesced duplicate open tickets for {len(duplicates)} user/type pairs")
+
+        await tickets.create_index(
+            [("telegram_id", 1), ("type", 1)],
+            name="open_ticket_per_type",
+            unique=True,
+            partialFilterExpression={"status": "open"}
+        )
+
+    # Users
+    async def get_user(self, telegram_id: int) -> Optional[dict]:
+        return restore_id(await self.db.users.find_one({"telegram_id": telegram_id}))
+
+    async def get_user_by_id(self, user_id: str) -> Optional[dict]:
+        return restore_id(await self.db.users.find_one(id_query(user_id)))
+
+    async def insert_user(self, user: dict):
+        await self.db.users.insert_one(to_storage(user))
+
+    async def update_user(self, telegram_id: int, fields: dict):
+        await self.db.users.update_one({"telegram_id": telegram_id}, {"$set": fields})
+
+    async def update_users(self, batch: Dict[int, dict]):
+        await self.db.users.bulk_write(
+            [UpdateOne({"telegram_id": telegram_id}, {"$set": fields}) for telegram_id, fields in batch.items()],
+            ordered=False
+        )
+
+    async def increment_user(self, telegram_id: int, field: str, amount: int = 1):
+        await self.db.users.update_one({"telegram_id": telegram_id}, {"$inc": {field: amount}})
+
+    async def update_user_by_id(self, user_id: str, fields: dict) -> Optional[dict]:
+        return await self.db.users.find_one_and_update(
+            id_query(user_id),
+            {"$set": fields},
+            projection={"_id": 0, "telegram_id": 1, "license_key": 1},
+            return_document=ReturnDocument.BEFORE
+        )
+
+    async def extend_user_license(self, user_id: str, days: float) -> Optional[dict]:
+        extend_ms = int(days * 24 * 60 * 60 * 1000)
+        return await self.db.users.find_one_and_update(
+            {**id_query(user_id), "license_expires": {"$ne": None}},
+            [{"$set": {"license_expires": {"$add": ["$license_expires", extend_ms]}}}],
+            projection={"_id": 0, "telegram_id": 1, "license_key": 1}
+        )
+
+    async def delete_user(self, user_id: str) -> Optional[dict]:
+        db = self.db
+        user = await db.users.find_one_and_delete(id_query(user_id), projection={"_id": 0, "telegram_id": 1})
+        if not user:
+            return None
+        # Everything that references the user, in parallel
+        results = await asyncio.gather(
+            db.tickets.delete_many({"user_id": user_id}),
+            db.script_executions.delete_many({"user_id": user_id}),
+            db.bot_activities.delete_many({"telegram_id": user["telegram_id"]}),
+            db.user_sessions.delete_many({"telegram_id": user["telegram_id"]})
+        )
+        return {
+            "telegram_id": user["telegram_id"],
+            "related_deleted": sum(result.deleted_count for result in results)
+        }
+
+    async def get_usernames(self, telegram_ids: Iterable[int]) -> Dict[int, Optional[str]]:
+        telegram_ids = list(telegram_ids)
+        users = await self.analytics_db.users.find(
+            {"telegram_id": {"$in": telegram_ids}}, {"_id": 0, "telegram_id": 1, "username": 1}
+        ).to_list(len(telegram_ids))
+        return {user["telegram_id"]: user.get("username") for user in users}
+
+    async def search_users(self, term: str, fields: List[str], limit: int) -> List[dict]:
+        # Anchored, case-sensitive regexes on the lowercased fields use the indexes
+        prefix = {"$regex": f"^{re.escape(term.lstrip('@').lower())}"}
+        clauses = [
+            {"username_lc": prefix},
+            {"first_name_lc": prefix},
+            {"last_name_lc": prefix},
+            {"license_key": term.upper()}
+        ]
+        if term.isdigit():
+            clauses.append({"telegram_id": int(term)})
+        return await self.analytics_db.users.find({"$or": clauses}, build_projection(fields)).limit(limit).to_list(limit)
+
+    @staticmethod
+    def _bulk_user_query(user_ids: Optional[List[str]], filters: Dict[str, Any]) -> dict:
+        query = {}
+        # Id matches may be $or queries (compact ids), so they are combined with $and
+        id_clauses = []
+        if user_ids:
+            id_clauses.append(id_in_query(user_ids))
+        for field, value in filters.items():
+            if field == "id":
+                id_clauses.append(id_query(value))
+            else:
+                query[field] = value
+        if id_clauses:
+            query["$and"] = id_clauses
+        return query
+
+    async def bulk_update_users(self, user_ids, filters, fields=None, extend_days=None, reset_licenses=False, id_limit=1000):
+        users = self.db.users
+        query = self._bulk_user_query(user_ids, filters)
+        # Counting first keeps broad filters from loading every matching id
+        telegram_ids = None
+        if await users.count_documents(query, limit=id_limit + 1) <= id_limit:
+            telegram_ids = await users.distinct("telegram_id", query)
+
+        counts = {}
+        if extend_days is not None:
+            # Extend in the database so each user keeps their own expiry
+            extend_ms = int(extend_days * 24 * 60 * 60 * 1000)
+            result = await users.update_many(
+                {**query, "license_expires": {"$ne": None}},
+                [{"$set": {"license_expires": {"$add": ["$license_expires", extend_ms]}}}]
+            )
+            counts["skipped"] = await users.count_documents({**query, "license_expires": None})
+        else:
+            if reset_licenses:
+                license_keys = await users.distinct("license_key", {**query, "license_key": {"$ne": None}})
+                counts["licenses_reset"] = 0
+                if license_keys:
+                    license_result = await self.db.licenses.update_many(
+                        {"license_key": {"$in": license_keys}},
+                        {"$set": {"is_reset": True}}
+                    )
+                    counts["licenses_reset"] = license_result.modified_count
+            result = await users.update_many(query, {"$set": fields})
+        return {"matched": result.matched_count, "modified": result.modified_count, **counts, "telegram_ids": telegram_ids}
+
+    # Sessions
+    async def open_session(self, telegram_id: int, started_at: datetime):
+        # last_activity too, so the idle check can't see a stale one
+        await self.db.users.update_one(
+            {"telegram_id": telegram_id, "session_started_at": {"$exists": False}},
+            {"$set": {"session_started_at": started_at, "last_activity": started_at}}
+        )
+
+    async def close_session(self, telegram_id, reason, ended_at=None, idle_before=None):
+        query = {"telegram_id": telegram_id, "session_started_at": {"$exists": True}}
+        if idle_before is not None:
+            # Idle sessions end with the last interaction
+            query["last_activity"] = {"$lt": idle_before}
+            end = "$last_activity"
+        else:
+            end = ended_at
+        seconds = {"$max": [0, {"$divide": [{"$subtract": [end, "$session_started_at"]}, 1000]}]}
+        # Seconds are kept so sub-minute sessions add up; total_login_time is in minutes
+        login_seconds = {"$ifNull": ["$login_seconds", {"$multiply": [{"$ifNull": ["$total_login_time", 0]}, 60]}]}
+        user = await self.db.users.find_one_and_update(
+            query,
+            [
+                {"$set": {"login_seconds": {"$add": [login_seconds, seconds]}, "session_started_at": "$$REMOVE"}},
+                {"$set": {"total_login_time": {"$toInt": {"$floor": {"$divide": ["$login_seconds", 60]}}}}}
+            ],
+            projection={"_id": 0, "session_started_at": 1, "last_activity": 1},
+            return_document=ReturnDocument.BEFORE
+        )
+        if not user:
+            return None
+        session = session_record(
+            telegram_id, user["session_started_at"], user["last_activity"] if idle_before else ended_at, reason
+        )
+        await self.db.user_sessions.insert_one(session)
+        return session["duration_seconds"]
+
+    async def idle_sessions(self, before: datetime, limit: int) -> List[int]:
+        users = await self.db.users.find(
+            {"session_started_at": {"$exists": True}, "last_activity": {"$lt": before}},
+            {"_id": 0, "telegram_id": 1}
+        ).limit(limit).to_list(limit)
+        return [user["telegram_id"] for user in users]
+
+    async def count_open_sessions(self) -> int:
+        return await self.analytics_db.users.count_documents({"session_started_at": {"$exists": True}})
+
+    async def session_stats(self, telegram_id=None, since=None) -> dict:
+        match = {} if telegram_id is None else {"telegram_id": telegram_id}
+        stats = await self.analytics_db.user_sessions.aggregate(session_stats_pipeline(match, since)).to_list(1)
+        return stats[0] if stats else dict(EMPTY_SESSION_STATS)
+
+    async def recent_sessions(self, telegram_id: int, limit: int) -> List[dict]:
+        return await self.analytics_db.user_sessions.find(
+            {"telegram_id": telegram_id}, {"_id": 0}
+        ).sort("started_at", -1).limit(limit).to_list(limit)
+
+    # Licenses
+    async def get_license(self, license_key: str, unused_only: bool = False) -> Optional[dict]:
+        query = {"license_key": license_key}
+        if unused_only:
+            query["is_used"] = False
+        return restore_id(await self.db.licenses.find_one(query))
+
+    async def insert_licenses(self, licenses: List[dict]):
+        await self.db.licenses.insert_many([to_storage(license_doc) for license_doc in licenses])
+
+    async def update_license(self, license_key: str, fields: dict):
+        await self.db.licenses.update_one({"license_key": license_key}, {"$set": fields})
+
+    async def consume_license_execution(self, license_key: str) -> Optional[dict]:
+        # Matches only while executions are left; -1 or missing = unlimited
+        return await self.db.licenses.find_one_and_update(
+            {
+                "license_key": license_key,
+                "$or": [
+                    {"max_executions": {"$not": {"$gte": 0}}},
+                    {"$expr": {"$lt": ["$executions_used", "$max_executions"]}}
+                ]
+            },
+            {"$inc": {"executions_used": 1}},
+            projection={"_id": 0, "max_executions": 1, "executions_used": 1},
+            return_document=ReturnDocument.AFTER
+        )
+
+    # Tickets
+    async def open_ticket(self, ticket: dict) -> dict:
+        new_fields = to_storage(ticket)
+        # Supplied by the filter or by $set/$inc below
+        for field in ("telegram_id", "type", "status", "updated_at", "request_count"):
+            new_fields.pop(field, None)
+
+        for attempt in range(2):
+            try:
+                return restore_id(await self.db.tickets.find_one_and_update(
+                    {"telegram_id": ticket["telegram_id"], "type": ticket["type"], "status": "open"},
+                    {
+                        "$setOnInsert": new_fields,
+                        "$set": {"updated_at": ticket["updated_at"]},
+                        "$inc": {"request_count": 1}
+                    },
+                    projection={"id": 1, "request_count": 1},
+                    upsert=True,
+                    return_document=ReturnDocument.AFTER
+                ))
+            except DuplicateKeyError:
+                # A concurrent request inserted the ticket first; retrying updates it
+                if attempt:
+                    raise
+
+    async def close_ticket(self, ticket_id: str, response: str) -> Optional[dict]:
+        return await self.db.tickets.find_one_and_update(
+            id_query(ticket_id),
+            {"$set": {"admin_response": response, "status": "closed", "updated_at": datetime.utcnow()}},
+            projection={"_id": 0, "telegram_id": 1}
+        )
+
+    async def delete_ticket(self, ticket_id: str) -> bool:
+        result = await self.db.tickets.delete_one(id_query(ticket_id))
+        return result.deleted_count > 0
+
+    async def open_ticket_stats(self) -> List[dict]:
+        groups = await self.analytics_db.tickets.aggregate([
+            {"$match": {"status": "open"}},
+            {"$group": {
+                "_id": "$type",
+                "open": {"$sum": 1},
+                "requests": {"$sum": {"$ifNull": ["$request_count", 1]}},
+                "oldest": {"$min": "$created_at"}
+            }},
+            {"$sort": {"_id": 1}}
+        ]).to_list(None)
+        return [{"type": group.pop("_id"), **group} for group in groups]
+
+    # Logs
+    async def insert_activity(self, activity: dict):
+        await self.db.bot_activities.insert_one(activity_to_storage(activity))
+
+    async def insert_execution(self, execution: dict):
+        await self.db.script_executions.insert_one(to_storage(execution))
+
+    async def clear_log(self, collection: str) -> int:
+        result = await self.db[collection].delete_many({})
+        return result.deleted_count
+
+    async def insert_audit(self, entry: dict):
+        await self.db.admin_audit.insert_one(dict(entry))
+
+    # Coordination between workers
+    async def acquire_lease(self, name: str, holder: str, ttl_seconds: float) -> bool:
+        now = datetime.utcnow()
+        try:
+            doc = await self.db.worker_leases.find_one_and_update(
+                {"_id": name, "$or": [{"holder": holder}, {"expires_at": {"$lt": now}}]},
+                {"$set": {"holder": holder, "expires_at": now + timedelta(seconds=ttl_seconds)}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # The upsert raced with a live lease held by another worker
+            return False
+        return bool(doc and doc.get("holder") == holder)
+
+    async def release_lease(self, name: str, holder: str):
+        await self.db.worker_leases.delete_one({"_id": name, "holder": holder})
+
+    async def publish_invalidations(self, events: List[dict]):
+        await self.db.cache_invalidations.insert_many(events, ordered=False)
+
+    async def invalidations_since(self, since: datetime, exclude_origin: str) -> List[dict]:
+        events = await self.db.cache_invalidations.find(
+            {"created_at": {"$gt": since}, "origin": {"$ne": exclude_origin}}
+        ).to_list(None)
+        for event in events:
+            event["id"] = event.pop("_id")
+        return events
+
+    # Dashboard lists
+    async def list_documents(self, collection, fields, filters=None, ascending=False, limit=1000):
+        cursor = self.analytics_db[collection].find(filters or {}, build_projection(fields))
+        cursor = cursor.sort(LIST_SORT_FIELDS[collection], 1 if ascending else -1).limit(limit)
+        return await cursor.to_list(limit)
+
+
+def storage_backend(config: Dict[str, Any]) -> str:
+    """The storage backend a tenant uses, chosen by STORAGE_BACKEND"""
+    backend = config.get("storage") or os.environ.get("STORAGE_BACKEND", "mongo")
+    if backend not in STORAGE_BACKENDS:
+        raise ValueError(f"Unknown STORAGE_BACKEND '{backend}', expected one of {', '.join(STORAGE_BACKENDS)}")
+    return backend
+
+
+def storage_from_env(config: Dict[str, Any], db, analytics_db) -> Storage:
+    """The storage for a tenant; db and analytics_db are only used by mongo"""
+    if storage_backend(config) == "mongo":
+        return MongoStorage(db, analytics_db)
+
+    from sqlite_storage import SQLiteStorage
+
+    directory = Path(os.environ.get("SQLITE_DIR", str(Path(__file__).parent / "data")))
+    return SQLiteStorage(directory / f"{config['db_name']}.sqlite3")
@@ -0,0 +1,144 @@
+"""
+Multi-bot (multi-tenant) hosting in a single process.
+
+Each tenant is one bot token with its own database, webhook path and
+per-tenant runtime state (caches, write buffers, job runner, ...), while the
+Mongo client and the Telegram HTTP pool are shared. The active tenant is
+carried in a ContextVar; TenantProxy objects resolve module-level names such
+as `bot` and `db` against it, so handler code stays tenant-agnostic.
+
+Extra tenants are read from the JSON file named by TENANTS_FILE:
+
+    [{"name": "shop2", "token_env": "SHOP2_TOKEN", "db_name": "shop2_db",
+      "backend_url": "https://shop2.example.com"}]
+"""
+
+import json
+import os
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+from starlette.datastructures import Headers, QueryParams
+from starlette.responses import JSONResponse
+
+DEFAULT_TENANT = "default"
+
+current_tenant: ContextVar[Optional["Tenant"]] = ContextVar("current_tenant", default=None)
+
+
+class Tenant:
+    """A bot token, its database and its runtime components"""
+
+    def __init__(self, name: str, config: Dict[str, Any]):
+        self.name = name
+        self.config = config
+
+    @property
+    def webhook_path(self) -> str:
+        if self.name == DEFAULT_TENANT:
+            return "/api/telegram-webhook"
+        return f"/api/telegram-webhook/{self.name}"
+
+
+class TenantRegistry:
+    def __init__(self):
+        self._tenants: Dict[str, Tenant] = {}
+
+    def add(self, tenant: Tenant):
+        if tenant.name in self._tenants:
+            raise ValueError(f"Duplicate tenant '{tenant.name}'")
+        self._tenants[tenant.name] = tenant
+
+    def get(self, name: str) -> Optional[Tenant]:
+        return self._tenants.get(name)
+
+    def all(self) -> List[Tenant]:
+        return list(self._tenants.values())
+
+    @property
+    def default(self) -> Tenant:
+        return self._tenants[DEFAULT_TENANT]
+
+    def current(self) -> Tenant:
+        return current_tenant.get() or self.default
+
+    async def run(self, tenant: Tenant, func, *args, **kwargs):
+        """Await func with tenant as the active tenant"""
+        token = current_tenant.set(tenant)
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            current_tenant.reset(token)
+
+
+class TenantProxy:
+    """Forwards attribute and item access to an attribute of the active tenant"""
+
+    def __init__(self, registry: TenantRegistry, attribute: str):
+        object.__setattr__(self, "_registry", registry)
+        object.__setattr__(self, "_attribute", attribute)
+
+    def _target(self):
+        return getattr(self._registry.current(), self._attribute)
+
+    def __getattr__(self, name):
+        return getattr(self._target(), name)
+
+    def __getitem__(self, key):
+        return self._target()[key]
+
+    def __setitem__(self, key, value):
+        self._target()[key] = value
+
+    def __repr__(self):
+        return f"<TenantProxy {self._attribute}>"
+
+
+class TenantSelector:
+    """ASGI middleware: requests pick their tenant with X-Bot-Tenant or ?tenant=
+
+    Plain ASGI rather than @app.middleware("http"), which would re-wrap every
+    response as a stream and defeat GZipMiddleware's minimum size.
+    """
+
+    def __init__(self, app, registry: TenantRegistry):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        name = Headers(scope=scope).get("x-bot-tenant") or QueryParams(scope["query_string"]).get("tenant")
+        if not name:
+            return await self.app(scope, receive, send)
+        tenant = self.registry.get(name)
+        if tenant is None:
+            response = JSONResponse(status_code=404, content={"detail": f"Unknown tenant '{name}'"})
+            return await response(scope, receive, send)
+        token = current_tenant.set(tenant)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_tenant.reset(token)
+
+
+def load_tenant_configs() -> List[Dict[str, Any]]:
+    """The default tenant from the environment plus any from TENANTS_FILE"""
+    configs = [{
+        "name": DEFAULT_TENANT,
+        "token": os.environ["TELEGRAM_TOKEN"],
+        "db_name": os.environ["DB_NAME"],
+        "backend_url": os.environ.get("REACT_APP_BACKEND_URL"),
+    }]
+
+    tenants_file = os.environ.get("TENANTS_FILE")
+    if tenants_file:
+        with open(tenants_file) as config_file:
+            for entry in json.load(config_file):
+                config = dict(entry)
+                if "token_env" in config:
+                    config["token"] = os.environ[config.pop("token_env")]
+                if not config.get("name") or not config.get("token") or not config.get("db_name"):
+                    raise ValueError(f"Tenant entries need name, token and db_name: {entry.get('name')}")
+                configs.append(config)
+    return configs
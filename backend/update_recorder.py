@@ -0,0 +1,68 @@
+"""
+Optional recording of raw Telegram updates for replay and benchmarking.
+
+When RECORD_UPDATES_PATH is set, every update reaching the webhook is
+appended as one JSON line ({"received_at": <unix time>, "update": {...}})
+to a size-rotated file. Writes and rotation happen on a listener thread, as
+for the main log (see logging_setup), so recording never blocks the event
+loop. replay_updates.py feeds such files back through handle_telegram_update.
+"""
+
+import logging
+import os
+import time
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, Tuple
+
+import orjson
+
+from logging_setup import start_pipeline
+
+
+class UpdateRecorder:
+    def __init__(self, path: str, max_bytes: int = 50 * 1024 * 1024, backup_count: int = 5, queue_size: int = 10000):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        output = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+        output.setFormatter(logging.Formatter("%(message)s"))
+        # A dedicated logger gives us rotation for free; updates beyond a
+        # full queue are dropped and counted rather than waited for
+        self.pipeline = start_pipeline(output, queue_size)
+        self._logger = logging.getLogger("update_recorder")
+        self._logger.setLevel(logging.INFO)
+        self._logger.propagate = False
+        self._logger.addHandler(self.pipeline.handler)
+        self.recorded = 0
+
+    def record(self, update_data: dict):
+        self._logger.info(orjson.dumps({"received_at": time.time(), "update": update_data}).decode())
+        self.recorded += 1
+
+    def stop(self):
+        """Write out queued updates"""
+        self.pipeline.stop()
+
+    def snapshot(self) -> dict:
+        return {"recorded": self.recorded, "dropped": self.pipeline.handler.dropped}
+
+
+def recorder_from_env() -> Optional[UpdateRecorder]:
+    path = os.environ.get("RECORD_UPDATES_PATH")
+    if not path:
+        return None
+    return UpdateRecorder(
+        path,
+        max_bytes=int(os.environ.get("RECORD_UPDATES_MAX_BYTES", 50 * 1024 * 1024)),
+        backup_count=int(os.environ.get("RECORD_UPDATES_BACKUPS", 5)),
+        queue_size=int(os.environ.get("RECORD_UPDATES_QUEUE_SIZE", 10000)),
+    )
+
+
+def read_recording(paths: Iterable[str]) -> Iterator[Tuple[float, dict]]:
+    """Yield (received_at, update) from recording files in the given order"""
+    for path in paths:
+        with open(path, "rb") as recording:
+            for line in recording:
+                if line.strip():
+                    entry = orjson.loads(line)
+                    yield entry["received_at"], entry["update"]
@@ -0,0 +1,71 @@
+"""
+Write-behind buffer for high-frequency, low-value document updates.
+
+Field updates are merged in memory per key and written periodically as one
+batch (a single unordered bulk_write on MongoDB), so a user sending many
+updates per minute costs one write per flush interval instead of one per
+update.
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindBuffer:
+    """Coalesces `$set` updates per key and flushes them in batches"""
+
+    def __init__(self, write_batch: Callable[[Dict[Any, dict]], Awaitable], interval_seconds: float = 5.0, max_pending: int = 10000):
+        # Called with {key: fields} for every flush
+        self.write_batch = write_batch
+        self.interval_seconds = interval_seconds
+        self.max_pending = max_pending
+        self._pending: Dict[Any, dict] = {}
+        self._flush_lock = asyncio.Lock()
+        self.flushed_writes = 0
+        self.coalesced_updates = 0
+
+    def set(self, key, fields: dict):
+        """Queue fields to $set on the document identified by key"""
+        pending = self._pending.get(key)
+        if pending is None:
+            self._pending[key] = dict(fields)
+        else:
+            pending.update(fields)
+            self.coalesced_updates += 1
+        if len(self._pending) >= self.max_pending and not self._flush_lock.locked():
+            asyncio.get_running_loop().create_task(self.flush())
+
+    def discard(self, key):
+        """Forget queued fields, e.g. when the document is deleted"""
+        self._pending.pop(key, None)
+
+    async def flush(self) -> int:
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+            batch, self._pending = self._pending, {}
+            try:
+                await self.write_batch(batch)
+            except Exception as e:
+                logger.error(f"Write-behind flush of {len(batch)} updates failed: {e}")
+                # Requeue, letting anything queued meanwhile win
+                for key, fields in batch.items():
+                    self._pending[key] = {**fields, **self._pending.get(key, {})}
+                return 0
+            self.flushed_writes += len(batch)
+            return len(batch)
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            await self.flush()
+
+    def snapshot(self) -> Dict[str, int]:
+        return {
+            "pending": len(self._pending),
+            "flushed_writes": self.flushed_writes,
+            "coalesced_updates": self.coalesced_updates,
+        }
@@ -4,25 +4,41 @@ set -e
 # Start the FastAPI backend
 cd /backend || { echo "Backend directory not found"; exit 1; }
 
-echo "Starting FastAPI backend"
-# Start Uvicorn with proper host binding
-uvicorn server:app --host 0.0.0.0 --port 8001 &
+echo "Starting FastAPI backend with ${UVICORN_WORKERS:-1} worker(s)"
+# Start Uvicorn with proper host binding; workers elect a leader through MongoDB.
+# On SIGTERM, closing connections (SHUTDOWN_CONNECTION_TIMEOUT), draining updates
+# and flushing buffers must finish within Docker's stop grace period, 10s by
+# default. When raising these timeouts, raise stop_grace_period (or
+# docker stop -t) and set SHUTDOWN_GRACE_PERIOD to match; the backend scales
+# the drain and flush timeouts down to fit SHUTDOWN_GRACE_PERIOD.
+uvicorn server:app --host 0.0.0.0 --port 8001 --workers "${UVICORN_WORKERS:-1}" \
+    --timeout-graceful-shutdown "${SHUTDOWN_CONNECTION_TIMEOUT:-2}" &
 BACKEND_PID=$!
 
-echo "Waiting for backend to start..."
-sleep 30
-
-if ! kill -0 $BACKEND_PID 2>/dev/null; then
-    echo "Backend failed to start at initialization, exiting"
-    exit 1
-fi
+echo "Waiting for backend to become ready..."
+READY_TIMEOUT=${READY_TIMEOUT:-60}
+WAITED=0
+until wget -q -O /dev/null http://127.0.0.1:8001/api/ready; do
+    if ! kill -0 $BACKEND_PID 2>/dev/null; then
+        echo "Backend failed to start at initialization, exiting"
+        exit 1
+    fi
+    if [ "$WAITED" -ge "$READY_TIMEOUT" ]; then
+        # Serve anyway (e.g. Telegram unreachable); /api/ready keeps reporting why
+        echo "Backend not ready after ${READY_TIMEOUT}s, starting nginx anyway"
+        break
+    fi
+    sleep 1
+    WAITED=$((WAITED + 1))
+done
 
 # Start Nginx
 nginx -g 'daemon off;' &
 NGINX_PID=$!
 
-# Handle termination signals
-trap 'kill $BACKEND_PID $NGINX_PID; exit 0' SIGTERM SIGINT
+# Handle termination signals; wait for the backend to drain updates and
+# flush its buffers (SHUTDOWN_DRAIN_TIMEOUT/SHUTDOWN_FLUSH_TIMEOUT) before exiting
+trap 'kill $BACKEND_PID $NGINX_PID; wait $BACKEND_PID; exit 0' SIGTERM SIGINT
 
 # Check if processes are still running
 while kill -0 $BACKEND_PID 2>/dev/null && kill -0 $NGINX_PID 2>/dev/null; do
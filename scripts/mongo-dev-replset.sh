@@ -0,0 +1,27 @@
+#!/bin/sh
+# Start a local replica set on one host for testing read routing.
+# Usage: scripts/mongo-dev-replset.sh [members] [data dir]
+# With two or more members, ANALYTICS_READ_PREFERENCE=secondary sends
+# dashboard reads to a secondary while bot writes stay on the primary.
+set -e
+
+MEMBERS=${1:-2}
+DATA_DIR=${2:-/tmp/mongo-rs0}
+BASE_PORT=27017
+
+HOSTS=""
+i=0
+while [ "$i" -lt "$MEMBERS" ]; do
+    PORT=$((BASE_PORT + i))
+    mkdir -p "$DATA_DIR/$i"
+    mongod --replSet rs0 --bind_ip localhost --port "$PORT" --dbpath "$DATA_DIR/$i" \
+        --fork --logpath "$DATA_DIR/$i/mongod.log"
+    HOSTS="$HOSTS{_id: $i, host: 'localhost:$PORT', priority: $([ "$i" -eq 0 ] && echo 1 || echo 0)},"
+    i=$((i + 1))
+done
+
+mongosh --quiet --port "$BASE_PORT" --eval "
+try { rs.status() } catch (e) { rs.initiate({_id: 'rs0', members: [$HOSTS]}) }
+"
+
+echo "MONGO_URL=\"mongodb://localhost:$BASE_PORT/?replicaSet=rs0\""
@@ -0,0 +1,182 @@
+"""
+Bot handlers on the SQLite storage backend, without MongoDB.
+
+Raw updates go through server.dispatch_update, against a stand-in bot and a
+fresh SQLite file per test.
+
+    python -m pytest -q tests
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+# Before server is imported: an empty MONGO_URL keeps backend/.env from
+# supplying one, so any MongoDB use fails
+os.environ.update({
+    "STORAGE_BACKEND": "sqlite",
+    "SQLITE_DIR": tempfile.mkdtemp(),
+    "MONGO_URL": "",
+    "TELEGRAM_TOKEN": "0:test",
+    "DB_NAME": "test_db",
+})
+os.environ.pop("TENANTS_FILE", None)
+os.environ.pop("RECORD_UPDATES_PATH", None)
+
+import server  # noqa: E402
+
+TELEGRAM_ID = 4242
+
+
+class RecordingBot:
+    """Stands in for telegram.Bot and keeps the texts it was asked to show"""
+
+    defaults = None
+    id = 0
+    username = "test_bot"
+    first_name = "Test"
+
+    def __init__(self):
+        self.texts = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.texts.append(text)
+        return True
+
+    async def edit_message_text(self, text, **kwargs):
+        self.texts.append(text)
+        return True
+
+    async def answer_callback_query(self, *args, **kwargs):
+        return True
+
+
+class SQLiteHandlerTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        with mock.patch.dict(os.environ, {"SQLITE_DIR": self.directory.name}):
+            self.tenant = server.build_tenant({"name": "test", "token": "0:test", "db_name": "test_db"})
+        self.bot = self.tenant.bot = RecordingBot()
+        self.storage = self.tenant.storage
+        self.assertIsNone(self.tenant.db)
+        await self.storage.ensure_indexes()
+        self.update_id = 0
+
+    async def asyncTearDown(self):
+        await self.storage.close()
+        self.directory.cleanup()
+
+    async def dispatch(self, update: dict):
+        self.update_id += 1
+        await server.tenant_registry.run(self.tenant, server.dispatch_update, {"update_id": self.update_id, **update})
+        return self.bot.texts[-1]
+
+    async def send(self, text: str) -> str:
+        """Send a text message; returns the text the bot answered with"""
+        return await self.dispatch({"message": {
+            "message_id": self.update_id,
+            "from": {"id": TELEGRAM_ID, "is_bot": False, "first_name": "Tess", "username": "tess"},
+            "chat": {"id": TELEGRAM_ID, "type": "private"},
+            "date": 0,
+            "text": text,
+        }})
+
+    async def press(self, data: str) -> str:
+        """Press an inline button; returns the text the bot answered with"""
+        return await self.dispatch({"callback_query": {
+            "id": str(self.update_id),
+            "from": {"id": TELEGRAM_ID, "is_bot": False, "first_name": "Tess", "username": "tess"},
+            "message": {"message_id": 1, "chat": {"id": TELEGRAM_ID, "type": "private"}},
+            "chat_instance": "1",
+            "data": data,
+        }})
+
+    async def activate_license(self, max_executions: int = -1) -> str:
+        license_doc = server.License(license_key=server.generate_license_key(), max_executions=max_executions)
+        await self.storage.insert_licenses([license_doc.dict()])
+        reply = await self.send(f"/license activate {license_doc.license_key}")
+        self.assertIn("License Successfully Activated", reply)
+        return license_doc.license_key
+
+    async def test_repeated_requests_coalesce_into_one_open_ticket(self):
+        first = await self.send("/buy")
+        second = await self.send("/buy")
+        await self.send("/unlock")
+
+        self.assertIn("Purchase Request Created", first)
+        self.assertIn("Purchase Already Requested", second)
+        stats = {entry["type"]: entry for entry in await self.storage.open_ticket_stats()}
+        self.assertEqual((stats["purchase"]["open"], stats["purchase"]["requests"]), (1, 2))
+        self.assertEqual((stats["unlock"]["open"], stats["unlock"]["requests"]), (1, 1))
+
+        # Once answered, the next request opens a new ticket
+        tickets = await self.storage.list_documents("tickets", ["id", "type"], {"type": "purchase"})
+        await self.storage.close_ticket(tickets[0]["id"], "Done")
+        self.assertIn("Purchase Request Created", await self.send("/buy"))
+        tickets = await self.storage.list_documents("tickets", ["status", "request_count"], {"type": "purchase"})
+        self.assertEqual(
+            sorted((ticket["status"], ticket["request_count"]) for ticket in tickets),
+            [("closed", 2), ("open", 1)]
+        )
+
+    async def test_program_start_consumes_execution_quota(self):
+        license_key = await self.activate_license(max_executions=2)
+
+        # Showing the menu is not an execution
+        self.assertIn("Executions left:** 2", await self.send("/start"))
+        self.assertIn("Executions left: 1", await self.press("start_program"))
+        self.assertIn("Executions left: 0", await self.press("start_program"))
+        self.assertIn("Execution Limit Reached", await self.press("start_program"))
+
+        license_doc = await self.storage.get_license(license_key)
+        self.assertEqual(license_doc["executions_used"], 2)
+        user = await self.storage.get_user(TELEGRAM_ID)
+        self.assertEqual(user["script_executions"], 2)
+        executions = await self.storage.list_documents("script_executions", ["user_id", "status"])
+        self.assertEqual(executions, [{"user_id": user["id"], "status": "success"}] * 2)
+
+    async def test_program_start_fails_closed_without_license_document(self):
+        license_key = await self.activate_license()
+        await self.storage.update_license(license_key, {"license_key": "GONE"})
+
+        self.assertIn("License not found", await self.press("start_program"))
+        self.assertEqual(await self.storage.list_documents("script_executions", ["id"]), [])
+
+    async def test_logout_closes_the_session(self):
+        await self.activate_license()
+        await self.send("/start")
+        self.assertIsNotNone((await self.storage.get_user(TELEGRAM_ID))["session_started_at"])
+        self.assertEqual(await self.storage.count_open_sessions(), 1)
+
+        self.assertIn("Logout Successful", await self.press("logout"))
+        await self.press("logout")
+
+        user = await self.storage.get_user(TELEGRAM_ID)
+        self.assertIsNone(user.get("session_started_at"))
+        self.assertEqual(await self.storage.count_open_sessions(), 0)
+        sessions = await self.storage.recent_sessions(TELEGRAM_ID, 10)
+        self.assertEqual([session["end_reason"] for session in sessions], ["logout"])
+        self.assertEqual((await self.storage.session_stats(TELEGRAM_ID))["sessions"], 1)
+
+    async def test_idle_session_ends_at_last_activity(self):
+        await self.activate_license()
+        await self.send("/start")
+        last_activity = datetime.utcnow() - timedelta(hours=2)
+        await self.storage.update_user(TELEGRAM_ID, {"last_activity": last_activity})
+
+        closed = await server.tenant_registry.run(self.tenant, self.tenant.session_tracker.expire_idle)
+
+        self.assertEqual(closed, [TELEGRAM_ID])
+        sessions = await self.storage.recent_sessions(TELEGRAM_ID, 10)
+        self.assertEqual([(session["end_reason"], session["ended_at"]) for session in sessions], [("idle", last_activity)])
+        self.assertEqual(await self.storage.count_open_sessions(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()